@@ -0,0 +1,71 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+# Compare the evaluation modes of evalspline on the initial constraints of a
+# point-to-point problem: these constrain the splines of a vehicle and their
+# derivatives at the symbolic time t0.
+
+from omgtools import *
+from omgtools.basics.spline import BSpline
+from omgtools.basics.spline_extra import evalspline
+import casadi as cas
+import time
+
+n_eval = 1000
+
+for knot_intervals, degree in [(10, 3), (20, 3), (40, 4)]:
+    vehicle = Holonomic(options={'degree': degree})
+    vehicle.define_knots(knot_intervals=knot_intervals)
+    basis = vehicle.basis
+    coeffs = cas.MX.sym('coeffs', len(basis), vehicle.n_spl)
+    t0 = cas.MX.sym('t0')
+    splines = [BSpline(basis, coeffs[:, k]) for k in range(vehicle.n_spl)]
+    values = np.random.rand(len(basis), vehicle.n_spl)
+    print('%d knot intervals, degree %d' % (knot_intervals, degree))
+    print('%10s | %8s | %8s | %10s | %10s | %10s' % (
+        'mode', 'MX nodes', 'SX instr', 'graph (ms)', 'build (ms)', 'eval (us)'))
+    result = {}
+    for mode in ['recursive', 'piecewise']:
+        # constraints on the splines and their derivatives
+        t_start = time.time()
+        con = cas.vertcat(*[evalspline(s.derivative(d), t0, mode)
+                            for s in splines for d in range(degree)])
+        t_graph = time.time() - t_start
+        # build the nlp functions as nlpsol does: expand to SX and compute the
+        # jacobian and hessian of the lagrangian
+        t_start = time.time()
+        x = cas.veccat(coeffs, t0)
+        lam = cas.MX.sym('lam', con.shape[0])
+        fun = cas.Function('con', [coeffs, t0], [con])
+        nlp_fun = cas.Function('nlp', [x, lam], [
+            con, cas.jacobian(con, x),
+            cas.hessian(cas.dot(lam, con), x)[0]]).expand()
+        t_build = time.time() - t_start
+        x_val = np.r_[values.ravel(order='F'), 0.37]
+        lam_val = np.ones(con.shape[0])
+        t_start = time.time()
+        for k in range(n_eval):
+            nlp_fun(x_val, lam_val)
+        t_eval = (time.time() - t_start)/n_eval
+        result[mode] = np.array(fun(values, 0.37))
+        print('%10s | %8d | %8d | %10.2f | %10.2f | %10.2f' % (
+            mode, fun.n_nodes(), fun.expand().n_instructions(), t_graph*1e3,
+            t_build*1e3, t_eval*1e6))
+    print('max difference: %.2e\n' % np.max(np.abs(
+        result['recursive'] - result['piecewise'])))
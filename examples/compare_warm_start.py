@@ -0,0 +1,75 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+# Compare the primal warm start of the receding horizon updates with the
+# primal-dual warm start, in which the multipliers of the previous update are
+# shifted over the horizon as well.
+
+from omgtools import *
+
+
+def point2point(freeT):
+    vehicle = Holonomic()
+    vehicle.set_options({'safety_distance': 0.1})
+    vehicle.set_initial_conditions([-1.5, -1.5])
+    vehicle.set_terminal_conditions([2., 2.])
+    environment = Environment(room={'shape': Square(5.)})
+    environment.add_obstacle(Obstacle({'position': [-0.6, -5.4]},
+                                      shape=Rectangle(width=0.2, height=12.)))
+    return Point2point(vehicle, environment, freeT=freeT)
+
+
+def formation():
+    N = 3
+    fleet = Fleet([Holonomic() for l in range(N)])
+    configuration = RegularPolyhedron(0.2, N, np.pi/4.).vertices.T
+    fleet.set_configuration(configuration.tolist())
+    fleet.set_initial_conditions(([-1.5, -1.5] + configuration).tolist())
+    fleet.set_terminal_conditions(([2., 2.] + configuration).tolist())
+    environment = Environment(room={'shape': Square(5.)})
+    environment.add_obstacle(Obstacle({'position': [1.7, 0.5]},
+                                      shape=Rectangle(width=3., height=0.2)))
+    return FormationPoint2pointCentral(fleet, environment,
+                                       options={'horizon_time': 15})
+
+problems = [('point2point fixedT', lambda: point2point(False)),
+            ('point2point freeT', lambda: point2point(True)),
+            ('formation', formation)]
+
+result = {}
+for name, create in problems:
+    for dual_warm_start in [False, True]:
+        problem = create()
+        problem.set_options({'verbose': 1, 'dual_warm_start': dual_warm_start})
+        problem.init()
+        simulator = Simulator(problem)
+        simulator.run()
+        # the first update is a cold start
+        iterations = np.array(problem.iter_counts[1:])
+        result[name, dual_warm_start] = (
+            np.mean(iterations), np.max(iterations),
+            1e3*np.mean(problem.update_times[1:]))
+
+print('%20s | %10s | %10s | %10s | %10s' % (
+    'problem', 'warm start', 'mean iter', 'max iter', 'upd (ms)'))
+for name, _ in problems:
+    for dual_warm_start in [False, True]:
+        print('%20s | %10s | %10.2f | %10d | %10.2f' % (
+            (name, ['primal', 'primal-dual'][dual_warm_start]) +
+            result[name, dual_warm_start]))
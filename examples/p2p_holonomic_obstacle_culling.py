@@ -0,0 +1,50 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+
+vehicle.set_initial_conditions([-8., -0.5])
+vehicle.set_terminal_conditions([8., 0.5])
+
+# create a long corridor with obstacles along the way
+environment = Environment(room={'shape': Rectangle(width=20., height=4.)})
+for x in [-5., -1., 3., 6.]:
+    environment.add_obstacle(Obstacle({'position': [x, 0.]}, shape=Circle(0.6)))
+
+# create a point-to-point problem
+problem = Point2point(vehicle, environment, freeT=True)
+# only avoid the obstacles that the vehicle can reach within 4 s: the problem
+# is rebuilt when an obstacle comes within reach and 5 updates after an
+# obstacle got out of reach
+problem.set_options({'verbose': 2,
+                     'obstacle_culling': {'enabled': True, 'horizon_time': 4.,
+                                          'interval': 5}})
+problem.init()
+
+# create simulator
+simulator = Simulator(problem)
+problem.plot('scene')
+vehicle.plot('input', knots=True, prediction=True, labels=['v_x (m/s)', 'v_y (m/s)'])
+
+# run it!
+simulator.run()
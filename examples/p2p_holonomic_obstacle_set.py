@@ -0,0 +1,53 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+import numpy as np
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+
+vehicle.set_initial_conditions([-1.5, -1.5])
+vehicle.set_terminal_conditions([2., 2.])
+
+# create a grid of moving circular obstacles
+obstacles = []
+trajectories = {'velocity': {'time': [0.], 'values': [[0., 0.1]]}}
+for x in np.linspace(-1.5, 1.5, 4):
+    for y in [-0.5, 1.]:
+        obstacles.append(Obstacle({'position': [x, y]}, shape=Circle(0.15),
+                                  simulation={'trajectories': trajectories}))
+
+# the obstacles of an ObstacleSet share their parameters and their collision
+# constraints are built once, which pays off for many obstacles
+environment = Environment(room={'shape': Square(5.)},
+                          obstacles=ObstacleSet(obstacles))
+
+# create a point-to-point problem
+problem = Point2point(vehicle, environment, freeT=False)
+problem.init()
+
+# create simulator
+simulator = Simulator(problem)
+problem.plot('scene')
+vehicle.plot('input', knots=True, prediction=True, labels=['v_x (m/s)', 'v_y (m/s)'])
+
+# run it!
+simulator.run()
@@ -0,0 +1,64 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+
+vehicle.set_initial_conditions([-1.5, -1.5])
+vehicle.set_terminal_conditions([2., 2.])
+
+# create environment
+environment = Environment(room={'shape': Square(5.)})
+# reserve room for 2 circular obstacles in the problem: obstacles that are
+# added later on fill a slot, which does not require to rebuild the problem
+environment.add_obstacle_slots(Circle(0.5), 2)
+
+trajectories = {'velocity': {'time': [0., 40.],
+                             'values': [[-0.35, 0.35], [0., 0.15]]}}
+moving = Obstacle({'position': [1.5, -1]}, shape=Circle(0.5),
+                  simulation={'trajectories': trajectories})
+environment.add_obstacle(moving)
+
+# create a point-to-point problem
+problem = Point2point(vehicle, environment, freeT=False)
+problem.init()
+
+# create simulator
+simulator = Simulator(problem)
+problem.plot('scene')
+vehicle.plot('input', knots=True, prediction=True, labels=['v_x (m/s)', 'v_y (m/s)'])
+
+# run for a while, and add an obstacle in the path of the vehicle
+for k in range(10):
+    simulator.update()
+    simulator.update_timing()
+environment.add_obstacle(Obstacle({'position': [0.5, 0.5]}, shape=Circle(0.4)))
+
+# and remove the moving one
+environment.remove_obstacle(moving)
+
+# run it!
+stop = False
+while not stop:
+    stop = simulator.update()
+    simulator.update_timing()
+problem.final()
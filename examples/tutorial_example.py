@@ -110,6 +110,8 @@ options = {}
 options['codegen'] = {'build': None}
 # options['codegen'] = {'build': 'jit', 'flags': '-O2'} # just-in-time compilation
 # options['codegen'] = {'build': 'shared', 'flags': '-O2'} # compile to shared object
+# Shared objects are cached (in ~/.cache/omgtools or $OMGTOOLS_CACHE_DIR), such
+# that identical problems are only compiled once. Disable with 'cache': False.
 # Compilation of the code takes some time, while execution is slightly faster
 # There are other options, set on a default value. Check them out with
 # problem.options
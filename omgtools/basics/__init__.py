@@ -1,2 +1,8 @@
 from .optilayer import OptiChild, OptiFather
 from .shape import *
+from .cache import set_cache_size, clear_caches, cache_info, cache_scope
+from .compile_cache import clear_compile_cache
+from .build_scheduler import build_scope
+from .instrumentation import enable_instrumentation, instrumentation_scope
+from .instrumentation import instrumentation_summary, export_json, export_csv
+from .telemetry import SolverTelemetry
@@ -0,0 +1,215 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Concurrent compilation of shared objects.
+
+Within a build_scope(), create_nlp and create_function (with build option
+'shared') only generate the c code. The compilation jobs are collected and
+run concurrently when the scope is left:
+
+    with build_scope(n_jobs=8) as scheduler:
+        problem1.init()
+        problem2.init()
+    print(scheduler.buildtimes)
+
+The functions that are returned in the meantime are stand-ins, which load the
+compiled shared object once it is available. Using one of them within the
+scope runs all pending jobs first.
+"""
+
+from __future__ import print_function
+from contextlib import contextmanager
+import collections as col
+import multiprocessing
+import shutil
+import time
+import os
+from .compile_cache import library_path, lookup, generate_source
+from .compile_cache import build_entry, compile_library, export_library
+from .compile_cache import evict, DEFAULT_CACHE_SIZE
+
+_scopes = []
+
+
+class PendingBuild(object):
+    """Stand-in for a function of which the compilation is scheduled"""
+
+    def __init__(self, scheduler, name):
+        self._scheduler = scheduler
+        self._name = name
+        self._function = None
+
+    def resolve(self):
+        if self._function is None:
+            self._scheduler.run()
+        return self._function
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return 'PendingBuild(%s)' % self._name
+
+
+class _Job(object):
+
+    def __init__(self, name, flags, load, pending):
+        self.name, self.flags = name, flags
+        self.load, self.pending = load, pending
+        self.source, self.path, self.export = None, None, None
+        self.cache_size = None
+        self.time = 0.
+
+
+class BuildScheduler(object):
+    """Collects compilation jobs and runs them on a pool of n_jobs workers
+
+    Every worker runs one gcc process at a time.
+
+    Args:
+        n_jobs (int): number of workers, default the number of cpus
+        verbose (int): print the build time per job if >= 1
+    """
+
+    def __init__(self, n_jobs=None, verbose=1):
+        self.n_jobs = n_jobs or multiprocessing.cpu_count() or 1
+        self.verbose = verbose
+        self.buildtimes = col.OrderedDict()
+        self.walltime = 0.
+        self._jobs = []
+
+    def submit(self, name, fun, generate, codegen, load, args=()):
+        """Generate the c code of fun and schedule its compilation
+
+        Returns a stand-in for load(path), with path the compiled shared
+        object. The arguments are as in compiled_library.
+        """
+        pending = PendingBuild(self, name)
+        job = _Job(name, codegen['flags'], load, pending)
+        directory = os.path.join(os.getcwd(), 'build')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, name+'.so')
+        if codegen.get('cache', True):
+            job.path = library_path(fun, job.flags, args,
+                                    codegen.get('cache_dir'))
+        if job.path is not None:
+            job.cache_size = codegen.get('cache_size', DEFAULT_CACHE_SIZE)
+            job.export = path
+            if not lookup(job.path):
+                job.source = generate_source(
+                    generate, os.path.dirname(job.path))
+        else:
+            job.path = path
+            job.source = generate_source(generate, directory)
+        self._jobs.append(job)
+        return pending
+
+    def run(self):
+        """Compile all pending jobs and load the results"""
+        jobs, self._jobs = self._jobs, []
+        if not jobs:
+            return
+        t0 = time.time()
+        try:
+            todo = [job for job in jobs if job.source is not None]
+            try:
+                from concurrent.futures import ThreadPoolExecutor
+            except ImportError:
+                # python 2 without the futures backport: compile serially
+                ThreadPoolExecutor, self.n_jobs = None, 1
+            if self.n_jobs == 1:
+                for job in todo:
+                    self._compile(job)
+            else:
+                with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+                    # result() raises the exception of a failed job
+                    for future in [pool.submit(self._compile, j) for j in todo]:
+                        future.result()
+        finally:
+            for job in jobs:
+                if job.source is not None:
+                    shutil.rmtree(os.path.dirname(job.source),
+                                  ignore_errors=True)
+        for job in jobs:
+            if job.export is not None:
+                # keep build/<name>.so up to date for the 'existing' build
+                export_library(job.path, job.export)
+                if job.cache_size is not None:
+                    evict(os.path.dirname(job.path), job.cache_size,
+                          keep=job.path)
+            job.pending._function = job.load(job.path)
+            self.buildtimes[job.name] = job.time
+        self.walltime += time.time() - t0
+        if self.verbose >= 1:
+            self.report(jobs, time.time() - t0)
+
+    def _compile(self, job):
+        t0 = time.time()
+        if job.export is not None:
+            build_entry(job.source, job.flags, job.path)
+        else:
+            compile_library(job.source, job.flags, job.path)
+        job.time = time.time() - t0
+
+    def report(self, jobs, walltime):
+        n_compiled = len([job for job in jobs if job.source is not None])
+        print('Compiled %d of %d shared object(s) on %d worker(s) in %5f s' %
+              (n_compiled, len(jobs), self.n_jobs, walltime))
+        for job in jobs:
+            if job.source is not None:
+                print('  %-20s %5f s' % (job.name, job.time))
+            else:
+                print('  %-20s cached' % job.name)
+
+    def discard(self):
+        """Drop all pending jobs"""
+        for job in self._jobs:
+            if job.source is not None:
+                shutil.rmtree(os.path.dirname(job.source), ignore_errors=True)
+        self._jobs = []
+
+
+def active_scheduler():
+    """Return the scheduler of the active build_scope, if any"""
+    return _scopes[-1] if _scopes else None
+
+
+@contextmanager
+def build_scope(n_jobs=None, verbose=1):
+    """Collect the compilation jobs in this scope and run them on exit.
+    Nested scopes add their jobs to the outermost scope."""
+    if _scopes:
+        yield _scopes[-1]
+        return
+    scheduler = BuildScheduler(n_jobs, verbose)
+    _scopes.append(scheduler)
+    try:
+        yield scheduler
+    except:
+        scheduler.discard()
+        raise
+    finally:
+        _scopes.pop()
+    scheduler.run()
@@ -0,0 +1,164 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Bounded caches for spline related computations.
+
+All caches are registered by name, such that their size can be configured,
+their statistics inspected and their content cleared from one place:
+
+    set_cache_size(256)                # bound all caches to 256 entries
+    set_cache_size(None, 'eval_basis') # do not bound the eval_basis cache
+    print(cache_info())
+    clear_caches()
+
+Entries added inside a cache_scope() are removed again when leaving the
+scope. This allows to keep the memory footprint of a long-running process
+flat, e.g. by building each problem inside its own scope.
+"""
+
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+DEFAULT_MAXSIZE = 1024
+
+CacheInfo = namedtuple('CacheInfo',
+                       ['hits', 'misses', 'evictions', 'size', 'maxsize'])
+
+_caches = OrderedDict()
+_scopes = []
+
+
+class LRUCache(object):
+    """A dictionary with a least-recently-used eviction policy.
+
+    Args:
+        name (str): name under which the cache is registered
+        maxsize (int): maximum number of entries, None means unbounded
+    """
+
+    def __init__(self, name, maxsize=DEFAULT_MAXSIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        _caches[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value  # move to the most recently used end
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if _scopes:
+            _scopes[-1].append((self, key))
+        self._evict()
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        self._evict()
+
+    def clear(self):
+        self._data.clear()
+
+    def reset_stats(self):
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         len(self._data), self.maxsize)
+
+
+def get_cache(name, maxsize=DEFAULT_MAXSIZE):
+    """Return the cache registered as name, create it if it does not exist"""
+    if name not in _caches:
+        LRUCache(name, maxsize)
+    return _caches[name]
+
+
+def _select(name):
+    if name is None:
+        return list(_caches.values())
+    if name not in _caches:
+        raise ValueError('Cache %s does not exist!' % name)
+    return [_caches[name]]
+
+
+def set_cache_size(maxsize, name=None):
+    """Bound the cache called name (default: all caches) to maxsize entries"""
+    for cache in _select(name):
+        cache.resize(maxsize)
+
+
+def clear_caches(name=None):
+    """Remove all entries of the cache called name (default: all caches)"""
+    for cache in _select(name):
+        cache.clear()
+
+
+def cache_info(name=None):
+    """Return a dictionary with the statistics of the registered caches"""
+    return OrderedDict((cache.name, cache.info()) for cache in _select(name))
+
+
+@contextmanager
+def cache_scope():
+    """Remove all cache entries that were added within this scope on exit"""
+    _scopes.append([])
+    try:
+        yield
+    finally:
+        for cache, key in _scopes.pop():
+            cache.discard(key)
+
+
+def array_key(x):
+    """Hashable key for an array that is only equal for identical arrays"""
+    x = np.asarray(x)
+    return (x.dtype.str, x.shape, x.tobytes())
+
+
+def value_key(x):
+    """Hashable key for a constructor argument (knots, degree, weights...)"""
+    if isinstance(x, (int, float, str)) or x is None:
+        return x
+    return tuple(np.asarray(x, dtype=float).ravel().tolist())
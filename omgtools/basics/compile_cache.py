@@ -0,0 +1,214 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Persistent cache of compiled shared objects.
+
+Shared objects are stored under a hash of the serialized casadi Function,
+together with everything else that determines the result of the compilation
+(solver, solver options, compiler flags). Identical problems are therefore
+only compiled once, also across processes and runs:
+
+    path = compiled_library(fun, generate, '-O2', ('ipopt', options))
+
+The cache directory is given by the codegen option 'cache_dir', or else by
+the environment variable OMGTOOLS_CACHE_DIR (default ~/.cache/omgtools).
+Writers of the same entry are serialized with a file lock, entries appear
+atomically and the least recently used entries are removed once there are
+more than 'cache_size' of them. Functions that can not be serialized (casadi
+< 3.5) are compiled without the cache.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import os
+import shutil
+import tempfile
+import itertools
+try:
+    import fcntl
+except ImportError:
+    # windows, on which the shared build options are not supported
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'OMGTOOLS_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'omgtools'))
+DEFAULT_CACHE_SIZE = 64
+
+_counter = itertools.count()
+
+
+def cache_key(fun, *args):
+    """Hash of a casadi Function and the (printable) arguments, None if the
+    Function can not be serialized (casadi < 3.5)"""
+    try:
+        serialized = fun.serialize()
+    except Exception:  # also AttributeError
+        return None
+    sha = hashlib.sha1(serialized.encode())
+    for arg in args:
+        sha.update(_canonical(arg).encode())
+    return sha.hexdigest()
+
+
+def _canonical(x):
+    # repr that does not depend on the order of dictionary entries
+    if isinstance(x, dict):
+        return '{%s}' % ','.join('%r:%s' % (key, _canonical(x[key]))
+                                 for key in sorted(x, key=str))
+    if isinstance(x, (list, tuple)):
+        return '[%s]' % ','.join(_canonical(v) for v in x)
+    return repr(x)
+
+
+@contextmanager
+def _lock(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def library_path(fun, flags, args=(), cache_dir=None):
+    """Return the path of the cache entry for fun, flags and args, None if
+    fun can not be cached"""
+    key = cache_key(fun, flags, args)
+    if key is None:
+        return None
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        # the directory exists, or was created concurrently
+        if not os.path.isdir(cache_dir):
+            raise
+    return os.path.join(cache_dir, key+'.so')
+
+
+def lookup(path):
+    """Check whether the entry path exists and mark it as recently used"""
+    try:
+        os.utime(path, None)
+    except OSError:
+        return False
+    return True
+
+
+def compiled_library(fun, generate, flags, args=(), cache_dir=None,
+                     cache_size=DEFAULT_CACHE_SIZE):
+    """Return the path of the shared object that implements fun
+
+    Args:
+        fun (Function): casadi Function that determines the cache key
+        generate (callable): generate(name) writes the c code to name.c in
+            the working directory
+        flags (str): compiler flags
+        args (tuple): extra arguments that determine the cache key
+        cache_dir (str): cache directory, default DEFAULT_CACHE_DIR
+        cache_size (int): maximum number of entries, None means unbounded
+
+    Returns None if fun can not be cached.
+    """
+    path = library_path(fun, flags, args, cache_dir)
+    if path is None:
+        return None
+    if not lookup(path):
+        source = generate_source(generate, os.path.dirname(path))
+        try:
+            build_entry(source, flags, path)
+        finally:
+            shutil.rmtree(os.path.dirname(source), ignore_errors=True)
+    if cache_size is not None:
+        evict(os.path.dirname(path), cache_size, keep=path)
+    return path
+
+
+def generate_source(generate, directory):
+    """Let generate write its c code to a new private subdirectory of
+    directory and return the path of the source file"""
+    name = 'omg_%d_%d' % (os.getpid(), next(_counter))
+    private = tempfile.mkdtemp(dir=directory)
+    try:
+        generate(name)
+        source = os.path.join(private, name+'.c')
+        shutil.move(name+'.c', source)
+    except:
+        if os.path.isfile(name+'.c'):
+            os.remove(name+'.c')
+        shutil.rmtree(private, ignore_errors=True)
+        raise
+    return source
+
+
+def compile_library(source, flags, path):
+    """Compile source to the shared object path, which is replaced
+    atomically: readers never see a partial file"""
+    target = os.path.splitext(source)[0]+'.so'
+    if os.system('gcc -fPIC -shared %s %s -o %s' %
+                 (flags, source, target)) != 0:
+        raise RuntimeError('Compilation of %s failed!' % source)
+    os.rename(target, path)
+
+
+def build_entry(source, flags, path):
+    """Compile source to the cache entry path, unless another writer did"""
+    with _lock(path+'.lock'):
+        if not os.path.isfile(path):
+            compile_library(source, flags, path)
+
+
+def export_library(path, target):
+    """Copy the shared object path to target, without touching a target that
+    is loaded by another process"""
+    tmp = '%s.%d' % (target, os.getpid())
+    shutil.copyfile(path, tmp)
+    os.rename(tmp, target)
+
+
+def evict(cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, keep=None):
+    """Remove the least recently used entries above cache_size"""
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    with _lock(os.path.join(cache_dir, 'evict.lock')):
+        entries = []
+        for f in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, f)
+            if f.endswith('.so') and path != keep:
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:  # removed by another process
+                    pass
+        entries.sort()
+        n_keep = cache_size - (keep is not None)
+        for _, path in entries[:max(len(entries)-n_keep, 0)]:
+            # Processes that loaded the library keep their (unlinked) copy. A
+            # writer that still waits on the removed lock can only cause a
+            # duplicate compilation, as entries are replaced atomically.
+            for f in (path, path+'.lock'):
+                if os.path.isfile(f):
+                    os.remove(f)
+
+
+def clear_compile_cache(cache_dir=None):
+    """Remove all entries of the compile cache"""
+    evict(cache_dir, 0)
@@ -0,0 +1,208 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Timers and counters for the phases of the receding horizon updates.
+
+Instrumentation is disabled by default, in which case the timers do nothing.
+Once enabled, every timed phase (build, set_parameters, update_bounds, solve,
+store, predict, simulate, plot...) is recorded together with the update in
+which it happened and the object that ran it:
+
+    enable_instrumentation()
+    simulator.run()
+    print(instrumentation_summary())
+    export_csv('timings.csv')
+
+The statistics of the solver calls (iteration count, time spent in the
+function evaluations) are recorded as well, see record_solver_stats.
+"""
+
+from __future__ import print_function
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import time
+import csv
+
+_recorder = None
+
+
+class Recorder(object):
+    """Collects the timed phases, counters and solver statistics"""
+
+    def __init__(self):
+        self.update = 0
+        self.phases = []  # (update, source, phase, duration)
+        self.counters = OrderedDict()
+        self.solver_stats = []
+
+    def record(self, phase, duration, source=''):
+        self.phases.append((self.update, source, phase, duration))
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        summary = OrderedDict()
+        for _, source, phase, duration in self.phases:
+            key = '%s.%s' % (source, phase) if source else phase
+            if key not in summary:
+                summary[key] = {'count': 0, 'total': 0., 'max': 0.}
+            entry = summary[key]
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['max'] = max(entry['max'], duration)
+        for entry in summary.values():
+            entry['mean'] = entry['total']/entry['count']
+        return summary
+
+    def to_dict(self):
+        keys = ['update', 'source', 'phase', 'duration']
+        return {'phases': [dict(zip(keys, p)) for p in self.phases],
+                'counters': dict(self.counters),
+                'solver_stats': self.solver_stats,
+                'summary': self.summary()}
+
+
+class _Timer(object):
+
+    def __init__(self, phase, source):
+        self.phase, self.source = phase, source
+
+    def __enter__(self):
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        # the recorder may have been disabled in the meantime
+        if _recorder is not None:
+            _recorder.record(self.phase, time.time() - self.t0, self.source)
+        return False
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_null_timer = _NullTimer()
+
+
+def enable_instrumentation(enabled=True):
+    """Start (or stop) recording, previous recordings are discarded"""
+    global _recorder
+    _recorder = Recorder() if enabled else None
+
+
+def instrumentation_enabled():
+    return _recorder is not None
+
+
+def get_recorder():
+    """Return the active Recorder, None if instrumentation is disabled"""
+    return _recorder
+
+
+def timed(phase, source=''):
+    """Context manager that records the duration of phase"""
+    if _recorder is None:
+        return _null_timer
+    return _Timer(phase, source)
+
+
+def record(phase, duration, source=''):
+    """Record a phase of which the duration was measured elsewhere"""
+    if _recorder is not None:
+        _recorder.record(phase, duration, source)
+
+
+def count(name, n=1):
+    """Increment the counter called name"""
+    if _recorder is not None:
+        _recorder.count(name, n)
+
+
+def next_update():
+    """Mark the start of a new update, called by the Deployer"""
+    if _recorder is not None:
+        _recorder.update += 1
+
+
+def record_solver_stats(stats, source='', phase='solve'):
+    """Record the iteration count, return status and the time spent in the
+    function evaluations from the stats() of a casadi solver"""
+    if _recorder is None:
+        return
+    entry = OrderedDict([('update', _recorder.update), ('source', source),
+                         ('phase', phase)])
+    for key in ['iter_count', 'return_status']:
+        if key in stats:
+            entry[key] = stats[key]
+    for key, value in stats.items():
+        if key.startswith(('t_wall_', 't_proc_', 'n_call_')):
+            entry[key] = value
+    _recorder.solver_stats.append(entry)
+
+
+def instrumentation_summary():
+    """Return the count, total, mean and max duration per (source.)phase"""
+    if _recorder is None:
+        return OrderedDict()
+    return _recorder.summary()
+
+
+def export_json(path):
+    """Write all recorded phases, counters and solver statistics to path"""
+    if _recorder is None:
+        raise ValueError('Instrumentation is not enabled!')
+    with open(path, 'w') as f:
+        json.dump(_recorder.to_dict(), f, indent=1)
+
+
+def export_csv(path, solver_stats_path=None):
+    """Write the recorded phases (and the solver statistics) as csv"""
+    if _recorder is None:
+        raise ValueError('Instrumentation is not enabled!')
+    with open(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['update', 'source', 'phase', 'duration'])
+        writer.writerows(_recorder.phases)
+    if solver_stats_path is not None:
+        keys = []
+        for entry in _recorder.solver_stats:
+            keys += [key for key in entry if key not in keys]
+        with open(solver_stats_path, 'w') as f:
+            writer = csv.DictWriter(f, keys)
+            writer.writeheader()
+            writer.writerows(_recorder.solver_stats)
+
+
+@contextmanager
+def instrumentation_scope():
+    """Record within this scope only, yields the Recorder"""
+    global _recorder
+    previous = _recorder
+    _recorder = Recorder()
+    try:
+        yield _recorder
+    finally:
+        _recorder = previous
@@ -25,13 +25,19 @@ except:
     from casadi import Importer
     Compiler = Importer
 from casadi import DM, MX, inf, Function, nlpsol, external
-from casadi import symvar, substitute
+from casadi import symvar, substitute, veccat, gradient, dot
 from casadi.tools import struct, struct_MX, struct_symMX, entry
-from .spline import BSpline
+from .spline import BSpline, SplineArray
+from .spline_extra import prewarm_shift_transforms
+from .compile_cache import compiled_library, export_library, DEFAULT_CACHE_SIZE
+from .compile_cache import generate_source, compile_library, cache_key
+from .cache import LRUCache
+from .build_scheduler import active_scheduler
+from .instrumentation import timed
 from itertools import groupby
+from contextlib import contextmanager
 import time
 import numpy as np
-import copy
 import os
 import shutil
 import collections as col
@@ -46,13 +52,35 @@ def evalf(fun, x):
 # Functions related to c code generation
 # ========================================================================
 
+# solvers of previously built nlps, see the problem option 'nlp_templates'
+_nlp_templates = LRUCache('nlp_template', 32)
+
+
 def create_nlp(var, par, obj, con, options, name=''):
     codegen = options['codegen']
+    slv_opt = options['solver_options'][options['solver']]
+    if options.get('nlp_templates', False):
+        # Problems with the same structure (and with all numeric data that
+        # differs between them passed as parameters) have the same nlp, up
+        # to the names of the symbols, and can share their solver.
+        t0 = time.time()
+        key = cache_key(Function('nlp', [var, par], [obj, con]),
+                        options['solver'], slv_opt, codegen['build'],
+                        codegen['flags'], name)
+        problem = None if key is None else _nlp_templates.get(key)
+        if problem is None:
+            problem, buildtime = create_nlp(
+                var, par, obj, con, dict(options, nlp_templates=False), name)
+            if key is not None:  # None without Function.serialize
+                _nlp_templates[key] = problem
+            return problem, buildtime
+        if options['verbose'] >= 1:
+            print('Reusing nlp template in %5f s' % (time.time()-t0))
+        return problem, time.time()-t0
     if options['verbose'] >= 1:
         print('Building nlp ... ', end=' ')
     t0 = time.time()
     nlp = {'x': var, 'p': par, 'f': obj, 'g': con}
-    slv_opt = options['solver_options'][options['solver']]
     opt = {}
     for key, value in slv_opt.items():
         opt[key] = value
@@ -70,20 +98,13 @@ def create_nlp(var, par, obj, con, options, name=''):
     elif codegen['build'] == 'shared':
         if os.name == 'nt':
             raise ValueError('Build option is not supported for Windows!')
-        directory = os.path.join(os.getcwd(), 'build')
-        if not os.path.isdir(directory):
-            os.makedirs(directory)
-        path = os.path.join(directory, name)
         if options['verbose'] >= 1:
             print(('[compile to .so with flags %s]' % (codegen['flags'])), end=' ')
-        if os.path.isfile(path+'.so'):
-            os.remove(path+'.so')
-        solver.generate_dependencies(name+'.c')
-        shutil.move(name+'.c', path+'.c')
-        os.system('gcc -fPIC -shared %s %s.c -o %s.so' %
-                  (codegen['flags'], path, path))
-        problem = nlpsol('solver', options['solver'], path+'.so', slv_opt)
-        os.remove(path+'.c')
+        problem = build_shared(
+            solver, lambda f: solver.generate_dependencies(f+'.c'), name,
+            codegen, lambda path: nlpsol('solver', options['solver'], path,
+                                         slv_opt),
+            (options['solver'], slv_opt))
     elif codegen['build'] == 'existing':
         if os.name == 'nt':
             raise ValueError('Build option is not supported for Windows!')
@@ -104,6 +125,40 @@ def create_nlp(var, par, obj, con, options, name=''):
     return problem, (t1-t0)
 
 
+def shared_library(fun, generate, name, codegen, args=()):
+    # Compile fun to build/<name>.so and return the path of the shared object
+    # to load. With the codegen option 'cache' (default True), the object is
+    # taken from the persistent compile cache if fun was compiled before, with
+    # the same flags and args (see compile_cache).
+    directory = os.path.join(os.getcwd(), 'build')
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, name+'.so')
+    if codegen.get('cache', True):
+        library = compiled_library(
+            fun, generate, codegen['flags'], args, codegen.get('cache_dir'),
+            codegen.get('cache_size', DEFAULT_CACHE_SIZE))
+        if library is not None:
+            # keep build/<name>.so up to date for the 'existing' build option
+            export_library(library, path)
+            return library
+    source = generate_source(generate, directory)
+    try:
+        compile_library(source, codegen['flags'], path)
+    finally:
+        shutil.rmtree(os.path.dirname(source), ignore_errors=True)
+    return path
+
+
+def build_shared(fun, generate, name, codegen, load, args=()):
+    # Return load(path), with path the shared object compiled from fun. Within
+    # a build_scope, the compilation is scheduled and a stand-in is returned.
+    scheduler = active_scheduler()
+    if scheduler is None:
+        return load(shared_library(fun, generate, name, codegen, args))
+    return scheduler.submit(name, fun, generate, codegen, load, args)
+
+
 def create_function(name, inp, out, options):
     codegen = options['codegen']
     if options['verbose'] >= 1:
@@ -121,20 +176,10 @@ def create_function(name, inp, out, options):
     elif codegen['build'] == 'shared':
         if os.name == 'nt':
             raise ValueError('Build option is not supported for Windows!')
-        directory = os.path.join(os.getcwd(), 'build')
-        if not os.path.isdir(directory):
-            os.makedirs(directory)
-        path = os.path.join(directory, name)
         if options['verbose'] >= 1:
             print(('[compile to .so with flags %s]' % (codegen['flags'])), end=' ')
-        if os.path.isfile(path+'.so'):
-            os.remove(path+'.so')
-        fun.generate(name+'.c')
-        shutil.move(name+'.c', path+'.c')
-        os.system('gcc -fPIC -shared %s %s.c -o %s.so' %
-                  (codegen['flags'], path, path))
-        fun = external(name, path+'.so')
-        os.remove(path+'.c')
+        fun = build_shared(fun, lambda f: fun.generate(f+'.c'), name, codegen,
+                           lambda path: external(name, path))
     elif codegen['build'] == 'existing':
         if os.name == 'nt':
             raise ValueError('Build option is not supported for Windows!')
@@ -178,25 +223,62 @@ class OptiFather(object):
     # ========================================================================
 
     def construct_problem(self, options, name='', problem=None):
-        self.compose_dictionary()
-        self.translate_symbols()
-        variables = self.construct_variables()
-        parameters = self.construct_parameters()
-        self.construct_substitutes(variables, parameters)
-        constraints, _, _ = self.construct_constraints(variables, parameters)
-        objective = self.construct_objective(variables, parameters)
+        self.build_times = col.OrderedDict()
+        self._translated = {}
+        with self._timed('compose'):
+            self.compose_dictionary()
+            self.translate_symbols()
+            variables = self.construct_variables()
+            parameters = self.construct_parameters()
+        with self._timed('substitutes'):
+            self.construct_substitutes(variables, parameters)
+        with self._timed('constraints'):
+            constraints, _, _ = self.construct_constraints(variables, parameters)
+        with self._timed('objective'):
+            objective = self.construct_objective(variables, parameters)
         self.problem_description = {'var': variables, 'par': parameters,
                                     'obj': objective, 'con': constraints,
                                     'opt': options}
         if problem is None:
-            problem, buildtime = create_nlp(variables, parameters, objective,
-                constraints, options, name)
+            with self._timed('nlp'):
+                problem, buildtime = create_nlp(variables, parameters,
+                                                objective, constraints,
+                                                options, name)
         else:
             buildtime = 0.
-        self.init_variables()
-        self.init_parameters()
+        with self._timed('initialize'):
+            self.init_variables()
+            self.init_parameters()
+        self._translated = {}
+        if options['verbose'] >= 3:
+            print('Build times:' + ''.join(
+                ' %s %5f s,' % item for item in self.build_times.items())[:-1])
         return problem, buildtime
 
+    def construct_rti(self, options, name=''):
+        # Build a second solver for the problem of construct_problem, with
+        # the solver given by options (e.g. sqpmethod with few iterations),
+        # and a function that evaluates the constraints and the gradient of
+        # the lagrangian, to monitor the convergence of the inexact solves.
+        desc = self.problem_description
+        var, par = desc['var'], desc['par']
+        obj, con = desc['obj'], desc['con']
+        name = 'rti' if name == '' else 'rti_' + name
+        with self._timed('rti'):
+            solver, buildtime = create_nlp(var, par, obj, con, options, name)
+            lam = MX.sym('lam', con.shape[0])
+            kkt, kkt_time = create_function(
+                'kkt_' + name, [var, par, lam],
+                [con, gradient(obj + dot(lam, con), var)], options)
+        return solver, kkt, buildtime + kkt_time
+
+    @contextmanager
+    def _timed(self, phase):
+        with timed('build_' + phase):
+            t0 = time.time()
+            yield
+            self.build_times[phase] = time.time() - t0
+
     def compose_dictionary(self):
         for child in self.children.values():
             self.symbol_dict.update(child.symbol_dict)
@@ -244,20 +326,31 @@ class OptiFather(object):
 
     def construct_substitutes(self, variables, parameters):
         self.substitutes = {}
+        self._subst_index, self._subst_expr = {}, []
         for child in self.children.values():
+            names = list(child._substitutes.keys())
+            expressions = self._substitute_symbols(
+                [child._substitutes[name][0] for name in names],
+                variables, parameters)
             self.substitutes[child] = {}
-            for name, subst in child._substitutes.items():
-                expr, _ = subst
-                expression = self._substitute_symbols(expr, variables, parameters)
+            for name, expression in zip(names, expressions):
                 self.substitutes[child][name] = Function(name, [variables, parameters], [expression])
+                self._subst_index[child, name] = len(self._subst_expr)
+                self._subst_expr.append(expression)
+        # all substitutes are evaluated at once by get_variables
+        self._subst_fun = Function('substitutes', [variables, parameters],
+                                   self._subst_expr)
 
     def construct_constraints(self, variables, parameters):
-        entries = []
+        keys, expressions = [], []
         for child in self.children.values():
             for name, constraint in child._constraints.items():
-                expression = self._substitute_symbols(
-                    constraint[0], variables, parameters)
-                entries.append(entry(child._add_label(name), expr=expression))
+                keys.append(child._add_label(name))
+                expressions.append(constraint[0])
+        expressions = self._substitute_symbols(
+            expressions, variables, parameters)
+        entries = [entry(key, expr=expression)
+                   for key, expression in zip(keys, expressions)]
         self._con_struct = struct(entries)
         constraints = struct_MX(entries)
         self._lb, self._ub = constraints(0), constraints(0)
@@ -269,13 +362,28 @@ class OptiFather(object):
                 if constraint[3]:
                     self._constraint_shutdown[
                         child._add_label(name)] = constraint[3]
+        self._init_bounds()
         return constraints, self._lb, self._ub
 
+    def _init_bounds(self):
+        # Flat bound vectors, patched in place by update_bounds. The shutdown
+        # conditions are compiled once to predicates of the time t.
+        self._lb_flat = np.array(self._lb.cat, dtype=float).ravel()
+        self._ub_flat = np.array(self._ub.cat, dtype=float).ravel()
+        self._lbg, self._ubg = self._lb_flat.copy(), self._ub_flat.copy()
+        self._shutdown = []
+        for name, shutdown in self._constraint_shutdown.items():
+            index = np.array(self._con_struct.f[name], dtype=int)
+            predicate = eval('lambda t: %s' % shutdown)
+            self._shutdown.append((predicate, index))
+        self._shutdown_state = np.zeros(len(self._shutdown), dtype=bool)
+
     def construct_objective(self, variables, parameters):
         objective = 0.
-        for child in self.children.values():
-            objective += self._substitute_symbols(
-                child._objective, variables, parameters)
+        for obj in self._substitute_symbols(
+                [child._objective for child in self.children.values()],
+                variables, parameters):
+            objective += obj
         return objective
 
     def reset(self):
@@ -283,53 +391,89 @@ class OptiFather(object):
             child.reset()
 
     def _substitute_symbols(self, expr, variables, parameters):
-        if isinstance(expr, (int, float)):
-            return expr
-        for sym in symvar(expr):
-            [child, name] = self.symbol_dict[sym.name()]
-            if name in child._variables:
-                expr = substitute(expr, sym, variables[child.label, name])
-            elif name in child._parameters:
-                expr = substitute(expr, sym, parameters[child.label, name])
-        return expr
-
-    def _evaluate_symbols(self, expression, variables, parameters):
-        symbols = symvar(expression)
-        f = Function(symbols, [expression])
-        f.init()
-        f_in = []
-        for sym in symbols:
+        # Replace the symbols of the children by their entry in the variables
+        # or parameters struct. A list of expressions is substituted with one
+        # call, such that shared subexpressions are only translated once.
+        # During construct_problem, translated expressions are memoized.
+        if not isinstance(expr, list):
+            return self._substitute_symbols([expr], variables, parameters)[0]
+        memo = getattr(self, '_translated', {})
+        result, todo = list(expr), []
+        for k, ex in enumerate(expr):
+            if isinstance(ex, (int, float)):
+                continue
+            if ex.__hash__() in memo:
+                result[k] = memo[ex.__hash__()][1]
+            else:
+                todo.append(k)
+        if not todo:
+            return result
+        symbols, values = [], []
+        for sym in symvar(veccat(*[expr[k] for k in todo])):
             [child, name] = self.symbol_dict[sym.name()]
             if name in child._variables:
-                f_in.append(variables[child.label, name])
+                symbols.append(sym)
+                values.append(variables[child.label, name])
             elif name in child._parameters:
-                f_in.append(parameters[child.label, name])
-        return evalf(f, f_in)
+                symbols.append(sym)
+                values.append(parameters[child.label, name])
+        translated = substitute([expr[k] for k in todo], symbols, values)
+        for k, ex in zip(todo, translated):
+            # keep the original expression alive: its hash is its address
+            memo[expr[k].__hash__()] = (expr[k], ex)
+            result[k] = ex
+        return result
 
     # ========================================================================
     # Problem evaluation
     # ========================================================================
 
     def update_bounds(self, current_time):
-        lb, ub = copy.deepcopy(self._lb), copy.deepcopy(self._ub)
-        for name, shutdown in self._constraint_shutdown.items():
-            exec('shutdown_fun = lambda t: %s' % shutdown)
-            if shutdown_fun(current_time):
-                lb[name], ub[name] = -inf, +inf
-        return lb, ub
+        # only the constraints of which the shutdown state changed are patched
+        for k, (predicate, index) in enumerate(self._shutdown):
+            shutdown = bool(predicate(current_time))
+            if shutdown != self._shutdown_state[k]:
+                self._shutdown_state[k] = shutdown
+                if shutdown:
+                    self._lbg[index], self._ubg[index] = -inf, +inf
+                else:
+                    self._lbg[index] = self._lb_flat[index]
+                    self._ubg[index] = self._ub_flat[index]
+        return self._lbg, self._ubg
 
     def init_variables(self):
         variables = self._var_struct(0.)
+        self._var_slices = col.OrderedDict()
         for label, child in self.children.items():
-            for name in child._variables.keys():
+            for name, var in child._variables.items():
                 variables[label, name] = child._values[name]
+                self._var_slices[child, name] = (
+                    self._slice(self._var_struct, label, name), var.shape)
         self._var_result = variables
         self._dual_var_result = self._con_struct(0.)
+        self._lam_x = np.zeros(self._var_struct.size)
+        self._eval_funs = {}
+        self._invalidate_results()
+
+    def _slice(self, struct, label, name):
+        # entries of a struct are stored contiguously, in column-major order
+        index = struct.f[label, name]
+        start = index[0] if index else 0
+        return slice(start, start+len(index))
 
     def init_parameters(self):
+        # flat parameter vector, with a fixed slice per parameter of a child
+        self._par_buffer = np.zeros(self._par_struct.size)
+        self._par_slices = col.OrderedDict()
+        for label, child in self.children.items():
+            for name, par in child._parameters.items():
+                self._par_slices[child, name] = (
+                    self._slice(self._par_struct, label, name), par.shape)
+        self._par_static = {}
         self.set_parameters(0.)
 
     def set_variables(self, variables, child=None, name=None):
+        self._invalidate_results()
         if child is None:
             self._var_result = self._var_struct(variables)
         elif name is None:
@@ -351,39 +495,70 @@ class OptiFather(object):
         elif name is None:
             return self._var_result.prefix(child.label)
         else:
+            spline = (name in child._splines_prim and
+                      not ('spline' in kwargs and not kwargs['spline']))
             if name in child._substitutes:
-                if name in child._splines_prim and not ('spline' in kwargs and not kwargs['spline']):
-                    basis = child._splines_prim[name]['basis']
-                    if 'symbolic' in kwargs and kwargs['symbolic']:
-                        if 'substitute' in kwargs and not kwargs['substitute']:
-                            coeffs = child._substitutes[name][1]
-                        else:
-                            coeffs = child._substitutes[name][0]
+                if 'symbolic' in kwargs and kwargs['symbolic']:
+                    if 'substitute' in kwargs and not kwargs['substitute']:
+                        coeffs = child._substitutes[name][1]
                     else:
-                        fun = self.substitutes[child][name]
-                        coeffs = np.array(fun(self._var_result, self._par_result))
+                        coeffs = child._substitutes[name][0]
+                    if not spline:
+                        return coeffs
+                    basis = child._splines_prim[name]['basis']
                     return [BSpline(basis, coeffs[:, k]) for k in range(coeffs.shape[1])]
-                else:
-                    if 'symbolic' in kwargs and kwargs['symbolic']:
-                        if 'substitute' in kwargs and not kwargs['substitute']:
-                            return child._substitutes[name][1]
-                        else:
-                            return child._substitutes[name][0]
-                    else:
-                        fun = self.substitutes[child][name]
-                        return np.array(fun(self._var_result, self._par_result))
-            if name in child._splines_prim and not ('spline' in kwargs and not kwargs['spline']):
+                return self._result(('subst', child, name, spline), lambda:
+                    self._wrap(child, name, spline, self._substitute_values()[
+                        self._subst_index[child, name]]))
+            if 'symbolic' in kwargs and kwargs['symbolic']:
+                coeffs = child._variables[name]
+                if not spline:
+                    return coeffs
                 basis = child._splines_prim[name]['basis']
-                if 'symbolic' in kwargs and kwargs['symbolic']:
-                    coeffs = child._variables[name]
-                else:
-                    coeffs = np.array(self._var_result[child.label, name])
                 return [BSpline(basis, coeffs[:, k]) for k in range(coeffs.shape[1])]
-            else:
-                if 'symbolic' in kwargs and kwargs['symbolic']:
-                    return child._variables[name]
-                else:
-                    return np.array(self._var_result[child.label, name])
+            return self._result(('var', child, name, spline), lambda:
+                self._wrap(child, name, spline, self._variable_view(child, name)))
+
+    # Numeric results are cached until the variables or parameters change.
+    # They are read-only views on one evaluation per solve.
+
+    def _invalidate_results(self):
+        self._results = {}
+
+    def _result(self, key, compute):
+        if key not in self._results:
+            self._results[key] = compute()
+        return self._results[key]
+
+    def _wrap(self, child, name, spline, coeffs):
+        if spline:
+            return SplineArray(child._splines_prim[name]['basis'], coeffs)
+        return coeffs
+
+    def _variable_view(self, child, name):
+        def flat():
+            flat = np.array(self._var_result.cat, dtype=float).ravel()
+            flat.flags.writeable = False
+            return flat
+        index, shape = self._var_slices[child, name]
+        return self._result('var', flat)[index].reshape(shape, order='F')
+
+    def _substitute_values(self):
+        def evaluate():
+            values = []
+            for value in self._subst_fun.call(
+                    [self._var_result.cat, self._par_buffer]):
+                value = np.array(value, dtype=float)
+                value.flags.writeable = False
+                values.append(value)
+            return values
+        return self._result('subst', evaluate)
+
+    def set_bound_multipliers(self, lam_x):
+        self._lam_x = np.array(lam_x, dtype=float).ravel()
+
+    def get_bound_multipliers(self):
+        return self._lam_x
 
     def get_dual_variables(self, child=None, name=None, **kwargs):
         if child is None:
@@ -402,47 +577,86 @@ class OptiFather(object):
                 if 'symbolic' in kwargs and kwargs['symbolic']:
                     coeffs = child._parameters[name]
                 else:
-                    coeffs = np.array(self._par_result[child.label, name])
+                    coeffs = self.parameter_view(child, name).copy()
                 return [BSpline(basis, coeffs[:, k]) for k in range(coeffs.shape[1])]
             else:
                 if 'symbolic' in kwargs and kwargs['symbolic']:
                     return child._parameters[name]
                 else:
-                    return np.array(self._par_result[child.label, name])
+                    return self.parameter_view(child, name).copy()
+
+    def parameter_view(self, child, name):
+        # writable view on the parameter in the flat parameter vector
+        self._invalidate_results()
+        index, shape = self._par_slices[child, name]
+        return self._par_buffer[index].reshape(shape, order='F')
+
+    @property
+    def _par_result(self):
+        return self._par_struct(self._par_buffer)
 
     def get_constraint(self, child, name, symbolic=False):
         if symbolic:
             return child._constraints[name][0]
         else:
-            return self._evaluate_symbols(self.children[child.label]._constraints[name][0],
-                self._var_result, self._par_result)
+            return self._evaluate(('con', child, name),
+                                  child._constraints[name][0])
 
     def get_objective(self, child, name, symbolic=False):
         if symbolic:
             return child._objective
         else:
-            return self._evaluate_symbols(self.children[child.label]._objective,
-                self._var_result, self._par_result)
+            return self._evaluate(('obj', child), child._objective)
+
+    def _evaluate(self, key, expression):
+        # the function that evaluates expression is built once per problem
+        if key not in self._eval_funs:
+            variables = self.problem_description['var']
+            parameters = self.problem_description['par']
+            self._eval_funs[key] = Function(
+                'eval', [variables, parameters], [self._substitute_symbols(
+                    expression, variables, parameters)])
+        def evaluate():
+            value = np.array(self._eval_funs[key](
+                self._var_result.cat, self._par_buffer), dtype=float)
+            value.flags.writeable = False
+            return value
+        return self._result(key, evaluate)
 
     def set_parameters(self, time):
-        self._par_result = self._par_struct(0.)
-        parameters = {}
-        for label, child in self.children.items():
-            par = child.set_parameters(time)
-            for chld, dic in par.items():
-                if chld not in parameters:
-                    parameters[chld] = {}
-                for key in dic.keys():
-                    if key in parameters[chld]:
+        # The parameters which the children set are written to their slice of
+        # the flat parameter vector. The others keep the value of the child,
+        # which is only written again if the child replaced it.
+        written = set()
+        for child in self.children.values():
+            for chld, dic in child.set_parameters(time).items():
+                for name, value in dic.items():
+                    if (chld, name) in written:
                         raise ValueError('Same parameter set multiple times!')
-                parameters[chld].update(par[chld])
-        for label, child in self.children.items():
-            for name in child._parameters.keys():
-                if child in parameters and name in parameters[child]:
-                    self._par_result[label, name] = parameters[child][name]
-                else:
-                    self._par_result[label, name] = child._values[name]
-        return self._par_result
+                    written.add((chld, name))
+                    if (chld, name) in self._par_slices:
+                        self._write_parameter(chld, name, value)
+                        self._par_static.pop((chld, name), None)
+        for (child, name) in self._par_slices:
+            if (child, name) not in written:
+                value = child._values[name]
+                if self._par_static.get((child, name)) is not value:
+                    self._write_parameter(child, name, value)
+                    self._par_static[child, name] = value
+        self._invalidate_results()
+        return self._par_buffer
+
+    def _write_parameter(self, child, name, value):
+        index, shape = self._par_slices[child, name]
+        value = np.asarray(value, dtype=float)
+        size = index.stop - index.start
+        if value.size == size:
+            self._par_buffer[index] = value.ravel(order='F')
+        elif value.size == 1:
+            self._par_buffer[index] = value.ravel()[0]
+        else:
+            raise ValueError('Parameter %s of %s should have %d entries, '
+                             'got %d!' % (name, child.label, size, value.size))
 
     # ========================================================================
     # Spline tranformations
@@ -451,23 +665,38 @@ class OptiFather(object):
     def init_transformations(self, init_primal_transform, init_dual_transform):
         # primal
         _init_tf = {}
-        for child in self.children.values():
-            for name, spl in child._splines_prim.items():
-                if name in child._variables or name in child._substitutes:
-                    basis = spl['basis']
-                    if basis not in _init_tf:
-                        _init_tf[basis] = init_primal_transform(basis)
-                    child._splines_prim[name]['init'] = _init_tf[basis]
+        for child, name, basis in self._transformation_bases('prim'):
+            if basis not in _init_tf:
+                _init_tf[basis] = init_primal_transform(basis)
+            child._splines_prim[name]['init'] = _init_tf[basis]
         # dual
         _init_tf = {}
+        for child, name, basis in self._transformation_bases('dual'):
+            if basis not in _init_tf:
+                _init_tf[basis] = init_dual_transform(basis)
+            child._splines_dual[name]['init'] = _init_tf[basis]
+
+    def prewarm_transformations(self, t_shifts=(), t_extras=()):
+        # fill the shift cache for all bases of init_transformations
+        bases = []
+        for _, _, basis in (list(self._transformation_bases('prim')) +
+                            list(self._transformation_bases('dual'))):
+            if basis not in bases:
+                bases.append(basis)
+        prewarm_shift_transforms(bases, t_shifts, t_extras)
+
+    def _transformation_bases(self, kind):
         for child in self.children.values():
-            for name, spl in child._splines_dual.items():
-                basis = spl['basis']
-                if basis not in _init_tf:
-                    _init_tf[basis] = init_dual_transform(basis)
-                child._splines_dual[name]['init'] = _init_tf[basis]
+            if kind == 'prim':
+                for name, spl in child._splines_prim.items():
+                    if name in child._variables or name in child._substitutes:
+                        yield child, name, spl['basis']
+            else:
+                for name, spl in child._splines_dual.items():
+                    yield child, name, spl['basis']
 
     def transform_primal_splines(self, transform_fun, seg_shift=None):
+        self._invalidate_results()
         # seg_shift: index list of the segments of which the variables must be shifted
         if seg_shift is None:
             # by default only shift first segment, with index 0
@@ -494,13 +723,21 @@ class OptiFather(object):
             for name, spl in child._splines_dual.items():
                 basis = spl['basis']
                 init = spl['init']
+                key = child._add_label(name)
+                coeffs = np.array(self._dual_var_result[key])
+                if coeffs.shape[0] != len(basis):
+                    # constraint on part of the coefficients: not transformed
+                    continue
                 if init is not None:
-                    init = spl['init']
-                    self._dual_var_result[label, name] = transform_fun(
-                        self._dual_var_result[label, name], basis, init)
+                    coeffs = transform_fun(coeffs, basis, init)
                 else:
-                    self._dual_var_result[label, name] = transform_fun(
-                        self._dual_var_result[label, name], basis)
+                    coeffs = transform_fun(coeffs, basis)
+                # multipliers of one-sided constraints keep their sign
+                # (positive for upper bounds, negative for lower bounds)
+                lb, ub = np.array(self._lb[key]), np.array(self._ub[key])
+                coeffs = np.where(np.isinf(lb) & (coeffs < 0.), 0., coeffs)
+                coeffs = np.where(np.isinf(ub) & (coeffs > 0.), 0., coeffs)
+                self._dual_var_result[key] = coeffs
 
 
 class OptiChild(object):
@@ -18,37 +18,46 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 import functools
+import itertools
+from math import factorial
 #import cvxopt
 import numpy as np
 import scipy.linalg as la
 import casadi as cas
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, diags, identity
+from scipy.special import comb
 # from piecewise import PiecewisePolynomial as ppoly
 # from scipy.sparse.linalg import spsolve
 from collections import Counter
-import hashlib
-
-def md5(data):
-  m = hashlib.md5()
-  m.update(data)
-  return m.digest()
+from .cache import LRUCache, array_key, value_key
 
 NO_POINTS = 501
+# above this number of blossom evaluations, products are collocated instead
+MAX_SUBSETS = 1000
+
+_transform_cache = LRUCache('transform')
+_product_cache = LRUCache('product')
+_derivative_cache = LRUCache('derivative')
+_piecewise_cache = LRUCache('piecewise')
 
 
 def memoize(f):
-    """ Memoization decorator"""
-    class memodict(dict):
+    """ Memoization decorator
+
+    Results are stored in a bounded cache named after the decorated function,
+    keyed on the instance and the exact content of the first argument.
+    """
+    class memodict(object):
         def __init__(self, f):
             self.f = f
+            self.cache = LRUCache(f.__name__)
 
         def __call__(self, *args):
-            key = (args[0], md5(np.atleast_1d(args[1])))
-            if key in self:
-                return self[key]
-            else:
-                ret = self[key] = self.f(*args)
-                return ret
+            key = (args[0], array_key(args[1])) + args[2:]
+            ret = self.cache.get(key)
+            if ret is None:
+                ret = self.cache[key] = self.f(*args)
+            return ret
 
         def __get__(self, obj, objtype):
             return functools.partial(self.__call__, obj)
@@ -58,17 +67,18 @@ def memoize(f):
 def cached_class(klass):
     """Decorator to cache class instances by constructor arguments.
     """
-    cache = {}
+    cache = LRUCache(klass.__name__)
 
     @functools.wraps(klass, assigned=('__name__', '__module__'), updated=())
     class _decorated(klass):
         __doc__ = klass.__doc__
 
         def __new__(cls, *args, **kwds):
-            key = (cls,) + tuple([md5(np.atleast_1d(k)) for k in args]) + tuple(kwds.items())
             try:
-                inst = cache.get(key, None)
-            except TypeError:  # Can't cache this set of arguments
+                key = ((cls,) + tuple([value_key(k) for k in args]) +
+                       tuple(sorted(kwds.items())))
+                inst = cache.get(key)
+            except (TypeError, ValueError):  # Can't cache these arguments
                 inst = key = None
             if inst is None:
                 inst = klass(*args, **kwds)
@@ -88,16 +98,227 @@ def get_module(var):
     return getattr(type(var), '__module__', '').split('.')[0]
 
 
+def find_span(knots, degree, x, side='left'):
+    """Return the index of the knot interval that contains each point of x.
+
+    Interval i is (knots[i], knots[i+1]], except for the first nonempty
+    interval, which also contains knots[0]. With side='right', interval i is
+    [knots[i], knots[i+1]) and the last nonempty interval contains knots[-1].
+    The second output flags the points that lie inside the domain.
+    """
+    knots = np.asarray(knots)
+    span = np.searchsorted(knots, x, side=side) - 1
+    first = np.searchsorted(knots, knots[0], side='right') - 1
+    last = np.searchsorted(knots, knots[-1], side='left') - 1
+    inside = (x >= knots[0]) & (x <= knots[-1])
+    # points outside the domain get the first or last nonempty interval
+    span = np.clip(span, first, last)
+    return span, inside
+
+
+def eval_nonzero_basis(knots, degree, x, span, o=0):
+    """Evaluate the degree+1 nonzero basis functions in each point of x.
+
+    Vectorized version of algorithms A2.2 and A2.3 in [Piegl & Tiller, The
+    NURBS Book, 1997]. Returns an array of shape (len(x), degree+1) with the
+    o-th derivative of basis functions span-degree, ..., span.
+    """
+    p = degree
+    n_x = len(x)
+    # pad the knots such that the de Boor triangle never leaves the knot
+    # vector: this does not alter the original basis functions
+    knots = np.r_[knots[0]*np.ones(p), knots, knots[-1]*np.ones(p)]
+    span = span + p
+    left = np.zeros((p + 1, n_x))
+    right = np.zeros((p + 1, n_x))
+    ndu = np.zeros((p + 1, p + 1, n_x))
+    ndu[0, 0] = 1.
+    for j in range(1, p + 1):
+        left[j] = x - knots[span + 1 - j]
+        right[j] = knots[span + j] - x
+        saved = 0.
+        for r in range(j):
+            ndu[j, r] = right[r + 1] + left[j - r]
+            temp = ndu[r, j - 1] / ndu[j, r]
+            ndu[r, j] = saved + right[r + 1]*temp
+            saved = left[j - r]*temp
+        ndu[j, j] = saved
+    if o == 0:
+        return ndu[:, p].T
+    if o > p:
+        return np.zeros((n_x, p + 1))
+    ders = np.zeros((p + 1, n_x))
+    for r in range(p + 1):
+        s1, s2 = 0, 1
+        a = np.zeros((2, p + 1, n_x))
+        a[0, 0] = 1.
+        for k in range(1, o + 1):
+            d = np.zeros(n_x)
+            rk, pk = r - k, p - k
+            if r >= k:
+                a[s2, 0] = a[s1, 0] / ndu[pk + 1, rk]
+                d = a[s2, 0]*ndu[rk, pk]
+            j1 = 1 if rk >= -1 else -rk
+            j2 = k - 1 if r - 1 <= pk else p - r
+            for j in range(j1, j2 + 1):
+                a[s2, j] = (a[s1, j] - a[s1, j - 1]) / ndu[pk + 1, rk + j]
+                d = d + a[s2, j]*ndu[rk + j, pk]
+            if r <= pk:
+                a[s2, k] = -a[s1, k - 1] / ndu[pk + 1, r]
+                d = d + a[s2, k]*ndu[r, pk]
+            s1, s2 = s2, s1
+        ders[r] = d
+    return (np.prod(np.arange(p - o + 1, p + 1))*ders).T
+
+
+def is_refinement(knots, degree, new_knots, new_degree):
+    """Return True if each spline on (knots, degree), restricted to the
+    domain of new_knots, can be represented exactly on (new_knots, new_degree).
+
+    This requires a higher or equal degree, a clamped knot sequence new_knots
+    in the domain of knots and that each knot inside this domain appears in
+    new_knots with its multiplicity raised by the degree difference.
+    """
+    r = new_degree - degree
+    a, b = new_knots[0], new_knots[-1]
+    if r < 0 or a < knots[0] or b > knots[-1]:
+        return False
+    if not (np.all(new_knots[:new_degree + 1] == a) and
+            np.all(new_knots[-(new_degree + 1):] == b)):
+        return False
+    values, mult = np.unique(knots, return_counts=True)
+    inner = (values > a) & (values < b)
+    values, mult = values[inner], mult[inner]
+    new_values, new_mult = np.unique(new_knots, return_counts=True)
+    ind = np.minimum(np.searchsorted(new_values, values), len(new_values) - 1)
+    return bool(np.all((new_values[ind] == values) &
+                       (new_mult[ind] >= mult + r)))
+
+
+def discrete_bsplines(knots, degree, mu, args):
+    """Evaluate the blossoms of the nonzero B-splines on knot interval mu.
+
+    For each column k of args (shape degree x n), the recursion of de Boor
+    is run with the point args[j-1, k] in step j. This returns an array of
+    shape (n, degree+1) with entries for basis functions mu-degree, ..., mu.
+    With equal arguments, this reduces to the evaluation of the basis.
+    """
+    p = degree
+    knots = np.r_[knots[0]*np.ones(p), knots, knots[-1]*np.ones(p)]
+    mu = mu + p
+    N = np.ones((1, len(mu)))
+    for j in range(1, p + 1):
+        x = args[j - 1]
+        N_new = np.zeros((j + 1, len(mu)))
+        for r in range(j + 1):
+            if r >= 1:
+                lo, hi = knots[mu - j + r], knots[mu + r]
+                N_new[r] += (x - lo) / (hi - lo) * N[r - 1]
+            if r < j:
+                lo, hi = knots[mu - j + r + 1], knots[mu + r + 1]
+                N_new[r] += (hi - x) / (hi - lo) * N[r]
+        N = N_new
+    return N.T
+
+
+def refinement_matrix(knots, degree, new_knots, new_degree):
+    """Exact transformation matrix from the basis (knots, degree) to the
+    basis (new_knots, new_degree), which should be a refinement as checked by
+    is_refinement. This covers knot insertion, degree elevation and
+    restriction to a subdomain at once.
+
+    Each new coefficient is the blossom of the spline evaluated at the
+    new_degree interior knots of the new basis function (Oslo algorithm). For
+    degree elevation, the blossom is symmetrized over all subsets of degree
+    arguments, which is done one degree at a time.
+    """
+    knots = np.asarray(knots, dtype=float)
+    new_knots = np.asarray(new_knots, dtype=float)
+    p, q = degree, new_degree
+    if q > p + 1:
+        # elevate one degree at a time: the number of subsets grows
+        # combinatorially with the degree difference
+        values, mult = np.unique(knots, return_counts=True)
+        elev_knots = np.repeat(values, mult + 1)
+        return csr_matrix_alt(
+            refinement_matrix(elev_knots, p + 1, new_knots, q).dot(
+                refinement_matrix(knots, p, elev_knots, p + 1)))
+    n, n_new = len(knots) - p - 1, len(new_knots) - q - 1
+    rows = np.arange(n_new)
+    # knot interval of the original basis on which the blossom is evaluated
+    mu = np.searchsorted(knots, new_knots[rows], side='right') - 1
+    last = np.searchsorted(knots, knots[-1], side='left') - 1
+    mu = np.minimum(mu, last)
+    args = new_knots[rows[None, :] + np.arange(1, q + 1)[:, None]]
+    subsets = list(itertools.combinations(range(q), p))
+    values = sum([discrete_bsplines(knots, p, mu, args[list(s)])
+                  for s in subsets]) / len(subsets)
+    cols = mu[:, None] - p + np.arange(p + 1)
+    rows = rows[:, None]*np.ones(p + 1, dtype=int)
+    valid = (cols >= 0) & (cols < n)
+    return csr_matrix_alt((values[valid], (rows[valid], cols[valid])),
+                          shape=(n_new, n))
+
+
+def product_matrix(knots1, degree1, knots2, degree2, knots, degree):
+    """Exact transformation matrix from the pairwise products of two bases
+    to the product basis (knots, degree), with degree = degree1 + degree2.
+
+    Column i*n2 + j corresponds to the product of basis function i of the
+    first and basis function j of the second basis. Each coefficient of the
+    product basis is the blossom of the product evaluated at its interior
+    knots, which is the average over all splits of these knots into degree1
+    arguments for the first and degree2 arguments for the second blossom
+    [Morken, Some identities for products and degree raising of splines,
+    1991].
+    """
+    knots1, knots2, knots = [np.asarray(k, dtype=float)
+                             for k in (knots1, knots2, knots)]
+    p1, p2, p = degree1, degree2, degree
+    n1, n2 = len(knots1) - p1 - 1, len(knots2) - p2 - 1
+    n = len(knots) - p - 1
+    rows = np.arange(n)
+    mu1 = np.minimum(np.searchsorted(knots1, knots[rows], side='right') - 1,
+                     np.searchsorted(knots1, knots1[-1], side='left') - 1)
+    mu2 = np.minimum(np.searchsorted(knots2, knots[rows], side='right') - 1,
+                     np.searchsorted(knots2, knots2[-1], side='left') - 1)
+    args = knots[rows[None, :] + np.arange(1, p + 1)[:, None]]
+    subsets = list(itertools.combinations(range(p), p1))
+    values = 0.
+    for s1 in subsets:
+        s2 = [k for k in range(p) if k not in s1]
+        b1 = discrete_bsplines(knots1, p1, mu1, args[list(s1)])
+        b2 = discrete_bsplines(knots2, p2, mu2, args[s2])
+        values = values + b1[:, :, None]*b2[:, None, :]
+    values = values / len(subsets)
+    cols1 = mu1[:, None, None] - p1 + np.arange(p1 + 1)[None, :, None]
+    cols2 = mu2[:, None, None] - p2 + np.arange(p2 + 1)[None, None, :]
+    cols1, cols2 = np.broadcast_arrays(cols1, cols2)
+    rows = np.broadcast_to(rows[:, None, None], cols1.shape)
+    valid = (cols1 >= 0) & (cols1 < n1) & (cols2 >= 0) & (cols2 < n2)
+    return csr_matrix_alt(
+        (values[valid], (rows[valid], cols1[valid]*n2 + cols2[valid])),
+        shape=(n, n1*n2))
+
+
 class csr_matrix_alt(csr_matrix):
     """Subclass csr_matrix to overload dot operator for MX/SX classes and
     cvxpy classes"""
     def __init__(self, *args, **kwargs):
         csr_matrix.__init__(self, *args, **kwargs)
+        self._dm = None
+
+    def to_dm(self):
+        """Return the matrix as casadi DM. The conversion is done once, so
+        the matrix should not be modified after it was used symbolically."""
+        if getattr(self, '_dm', None) is None:
+            self._dm = cas.DM(csr_matrix(self))
+        return self._dm
 
     def dot(self, other):
         if isinstance(other, (cas.MX, cas.SX)):
             # compatible with casadi 3.0 -- added by ruben
-            return cas.mtimes(cas.DM(csr_matrix(self)), other)
+            return cas.mtimes(self.to_dm(), other)
             # NOT COMPATIBLE WITH CASADI 2.4
             # return cas.DMatrix(csr_matrix(self)).mul(other)
         elif get_module(other) in ['cvxpy', 'cvxopt']:
@@ -121,6 +342,7 @@ class Basis(object):
         self.knots = np.array(knots)
         self.degree = degree
         self._x = np.linspace(knots[0], knots[-1], NO_POINTS)
+        self._hash = None
 
     def __len__(self):
         return len(self.knots) - self.degree - 1
@@ -182,11 +404,9 @@ class Basis(object):
         return self.knots.shape == other.knots.shape and all(self.knots == other.knots) and self.degree == other.degree
 
     def __hash__(self):
-        sh = [hash(self.degree)] + [hash(e) for e in self.knots]
-        r = sh[0]
-        for e in sh[1:]:
-          r = r ^ e
-        return r
+        if self._hash is None:
+            self._hash = hash((self.degree, tuple(self.knots.tolist())))
+        return self._hash
 
     def insert_knots(self, knots):
         unique_knots = np.setdiff1d(knots, self.knots)
@@ -214,50 +434,113 @@ class BSplineBasis(Basis):
     def eval_basis(self, x):
         """Evaluate the BSplineBasis at x.
 
-        This function implements the Cox-de Boor formula for B-splines
+        Only the degree+1 nonzero basis functions are evaluated in each point,
+        using the de Boor triangle on the knot span that contains the point.
         """
-        x = np.array(x)
-        k = self.knots
-        basis = [[self._ind(i, x) * 1.0 for i in range(len(k) - 1)]]
-        for d in range(1, self.degree + 1):
-            basis.append([])
-            for i in range(len(k) - d - 1):
-                b = 0 * x
-                bottom = k[i + d] - k[i]
-                if bottom != 0:
-                    b = (x - k[i]) * basis[d - 1][i] / bottom
-                bottom = k[i + d + 1] - k[i + 1]
-                if bottom != 0:
-                    b += (k[i + d + 1] - x) * basis[d - 1][i + 1] / bottom
-                basis[-1].append(b)
-        # Consider sparse matrices?
-        return csr_matrix_alt(np.c_[basis[-1]].T)
+        return self._eval_sparse(x, 0)
+
+    @memoize
+    def eval_derivative(self, x, o=1):
+        """Evaluate the o-th derivative of the basis functions at x.
+
+        Args:
+            x (numpy.array): grid on which to evaluate basisfunctions
+            o (int): order of the derivative (default is 1)
+
+        Returns:
+            csr_matrix_alt: row i contains the o-th derivative of all
+                basisfunctions evaluated at x[i]
+        """
+        return self._eval_sparse(x, o)
+
+    @memoize
+    def design_matrix(self, x, o=0):
+        """Sparse matrix that evaluates the o-th derivative at x of any spline
+        in this basis, by multiplication with its coefficients.
+
+        Contrary to eval_basis, the knot intervals are closed on the left and
+        points outside the domain are evaluated by extrapolating the first or
+        last polynomial piece, as splev does.
+        """
+        return self._eval_sparse(x, o, extrapolate=True)
+
+    def _eval_sparse(self, x, o, extrapolate=False):
+        x = np.atleast_1d(np.array(x, dtype=float)).ravel()
+        n_x, d = len(x), self.degree
+        side = 'right' if extrapolate else 'left'
+        span, inside = find_span(self.knots, d, x, side)
+        if extrapolate:
+            inside = np.ones(n_x, dtype=bool)
+        values = eval_nonzero_basis(self.knots, d, x[inside], span[inside], o)
+        indices = span[inside, None] - d + np.arange(d + 1)
+        valid = (indices >= 0) & (indices < len(self))
+        if not valid.all():  # knot vector without degree-fold end knots
+            rows = np.where(inside)[0][:, None]*np.ones(d + 1, dtype=int)
+            return csr_matrix_alt(
+                (values[valid], (rows[valid], indices[valid])),
+                shape=(n_x, len(self)))
+        # build the csr arrays directly: each point has degree+1 entries
+        indptr = np.r_[0, np.cumsum(inside)*(d + 1)]
+        return csr_matrix_alt((values.ravel(), indices.ravel(), indptr),
+                              shape=(n_x, len(self)))
 
     def derivative(self, o=1):
         """Returns derivative of the basisfunctions
 
         Computes the derivative using eq. (16) in [de Boor, Chapter X, 2001].
+        The sparse differentiation operators are cached per basis and order,
+        higher orders are built by chaining the first order operators.
 
         Args:
-            x (numpy.array): grid on which to evaluate basisfunctions
             o (int): order of the derivative (default is 1)
 
         Returns:
-            Numpy.array: columns contain the value of the derivative of the
-                basisfunction evaluated at x
+            tuple: basis of the derivative and sparse matrix P that maps the
+                coefficients of a spline to those of its o-th derivative
         """
-        B = self.__class__(self.knots[o:-o], self.degree - o)
-        P = np.eye(len(self))
-        knots = self.knots
-        for i in range(o):
-            knots = knots[1:-1]
-            delta_knots = knots[self.degree - i:] - knots[:- self.degree + i]
-            T = np.zeros((len(self) - 1 - i, len(self) - i))
-            j = np.arange(len(self) - 1 - i)
-            T[(j, j)] = -1. / delta_knots
-            T[(j, j + 1)] = 1. / delta_knots
-            P = (self.degree - i) * np.dot(T, P)
-        return B, csr_matrix_alt(P)
+        key = (self, o)
+        result = _derivative_cache.get(key)
+        if result is None:
+            if o == 0:
+                B, P = self, identity(len(self))
+            elif o == 1:
+                knots = self.knots[1:-1]
+                delta_knots = knots[self.degree:] - knots[:-self.degree]
+                B = self.__class__(knots, self.degree - 1)
+                P = self.degree * diags(
+                    [-1. / delta_knots, 1. / delta_knots], [0, 1],
+                    shape=(len(self) - 1, len(self)))
+            else:
+                B1, P1 = self.derivative(o - 1)
+                B, P2 = B1.derivative()
+                P = P2.dot(P1)
+            result = _derivative_cache[key] = (B, csr_matrix_alt(P))
+        return result
+
+    def piecewise_polynomial(self):
+        """Return the breakpoints and a sparse matrix P that maps the
+        coefficients of a spline in this basis to the coefficients of its
+        polynomial pieces. Row j*(degree+1) + m of P yields the coefficient
+        of (x - breaks[j])**m of the piece on the j-th knot interval. The
+        result is cached per basis.
+        """
+        result = _piecewise_cache.get(self)
+        if result is None:
+            p = self.degree
+            breaks = np.unique(self.knots)
+            span = np.searchsorted(self.knots, breaks[:-1], side='right') - 1
+            values = np.array([eval_nonzero_basis(
+                self.knots, p, breaks[:-1], span, o) / factorial(o)
+                for o in range(p + 1)])  # (order, interval, function)
+            rows = (np.arange(len(span))[None, :, None]*(p + 1) +
+                    np.arange(p + 1)[:, None, None])
+            cols = span[None, :, None] - p + np.arange(p + 1)[None, None, :]
+            rows, cols = np.broadcast_arrays(rows, cols)
+            valid = (cols >= 0) & (cols < len(self))
+            P = csr_matrix_alt((values[valid], (rows[valid], cols[valid])),
+                               shape=(len(span)*(p + 1), len(self)))
+            result = _piecewise_cache[self] = (breaks, P)
+        return result
 
     def support(self):
         """Return a list of support intervals for each basis function"""
@@ -280,6 +563,56 @@ class BSplineBasis(Basis):
         # S[[pairs[0], pairs[0] * len(self) + pairs[1]]] = 1.
         return pairs, S
 
+    def product(self, other, TOL=1e-10):
+        """Return the operator that multiplies splines in two bases.
+
+        Returns the product basis, a sparse matrix T and index arrays i and j
+        such that for splines with coefficients c1 in self and c2 in other,
+        the product has coefficients T.dot(c1[i]*c2[j]) in the product basis.
+        Only pairs of basis functions with overlapping support are kept. The
+        operator is exact and cached per pair of bases.
+        """
+        key = (self, other)
+        result = _product_cache.get(key)
+        if result is None:
+            basis = self * other
+            if comb(basis.degree, self.degree, exact=True) > MAX_SUBSETS:
+                T = self._collocated_product(other, basis)
+            else:
+                T = product_matrix(self.knots, self.degree, other.knots,
+                                   other.degree, basis.knots, basis.degree)
+            T.data[abs(T.data) < TOL] = 0.
+            T.eliminate_zeros()
+            cols = np.unique(T.indices)
+            T = csr_matrix_alt(T[:, cols])
+            i, j = cols // len(other), cols % len(other)
+            result = _product_cache[key] = (basis, T, i.tolist(), j.tolist())
+        return result
+
+    def _collocated_product(self, other, basis):
+        # interpolate the pairwise products at the Greville abscissae of the
+        # product basis, which are unisolvent (Schoenberg-Whitney)
+        x = np.array(basis.greville())
+        b1, b2 = self.design_matrix(x), other.design_matrix(x)
+        rows, cols, values = [], [], []
+        for k in range(len(x)):
+            s1 = slice(b1.indptr[k], b1.indptr[k + 1])
+            s2 = slice(b2.indptr[k], b2.indptr[k + 1])
+            i1, v1 = b1.indices[s1], b1.data[s1]
+            i2, v2 = b2.indices[s2], b2.data[s2]
+            cols.append((i1[:, None]*len(other) + i2[None, :]).ravel())
+            values.append((v1[:, None]*v2[None, :]).ravel())
+            rows.append(k*np.ones(len(cols[-1]), dtype=int))
+        P = csr_matrix((np.concatenate(values),
+                        (np.concatenate(rows), np.concatenate(cols))),
+                       shape=(len(x), len(self)*len(other)))
+        # only solve for the pairs with overlapping support
+        nz = np.unique(P.indices)
+        T = np.zeros((len(basis), P.shape[1]))
+        T[:, nz] = la.solve(basis.design_matrix(x).toarray(),
+                            P[:, nz].toarray())
+        return csr_matrix_alt(T)
+
     def transform(self, other, TOL=1e-10):
         """Transformation from one basis to another.
 
@@ -287,15 +620,35 @@ class BSplineBasis(Basis):
 
             self(x).T = other(x)
 
-        TODO: Can we use the greville points instead of max?
+        If self is a refinement of other (after knot insertion, degree
+        elevation and/or restriction to a subdomain), T is built exactly from
+        the knot sequences. Otherwise, T follows from a least squares like
+        fit on NO_POINTS samples. Transformations between two bases are
+        cached.
         """
+        if not isinstance(other, BSplineBasis):
+            return self._sampled_transform(other, TOL)
+        key = (self, other)
+        T = _transform_cache.get(key)
+        if T is None:
+            if self == other:
+                T = csr_matrix_alt(np.eye(len(self)))
+            elif is_refinement(other.knots, other.degree,
+                               self.knots, self.degree):
+                T = refinement_matrix(other.knots, other.degree,
+                                      self.knots, self.degree)
+                T.data[abs(T.data) < TOL] = 0.
+                T.eliminate_zeros()
+            else:
+                T = self._sampled_transform(other, TOL)
+            _transform_cache[key] = T
+        return T
+
+    def _sampled_transform(self, other, TOL=1e-10):
         b = self(self._x).toarray()
         m = np.argmax(b, axis=0)
-        # x = np.linspace(self.knots[0], self.knots[-1], NO_POINTS)
         xmax = self._x[m]
         if isinstance(other, BSplineBasis):
-            # if (self.knots[0] == other.knots[0] and
-            #    self.knots[-1] == other.knots[-1]):
             T = la.solve(b[m, :], other(xmax).toarray())
         else:
             try:
@@ -418,21 +771,14 @@ class BSpline(Spline):
 
     def __mul__(self, other):
         if isinstance(other, self.__class__):
-            basis = self.basis * other.basis
-            pairs, S = self.basis.pairs(other.basis)
-            b_self = self.basis(basis._x)
-            b_other = other.basis(basis._x)
-            basis_product = b_self[:, pairs[0]].multiply(b_other[:, pairs[1]])
-            T = basis.transform(lambda y: basis_product.toarray()[y, :])
+            basis, T, i, j = self.basis.product(other.basis)
             try:
-                coeffs_product = (self.coeffs[pairs[0].tolist()] *
-                                  other.coeffs[pairs[1].tolist()])
+                coeffs_product = self.coeffs[i] * other.coeffs[j]
             except:  # cvxopt, cvxpy, assuming other.coeffs is not a variable
-                S = np.zeros((len(pairs[0]), len(self)))
-                S[[list(range(len(pairs[0]))), pairs[0]]] = 1.
+                S = np.zeros((len(i), len(self)))
+                S[[list(range(len(i))), i]] = 1.
                 S = cvxopt.matrix(S)
-                coeffs_product = cvxopt.spdiag(other.coeffs[pairs[1].tolist()]) * S * self.coeffs
-                # coeffs_product = cp.vstack(*[self.coeffs[p0] * other.coeffs[p1] for (p0, p1) in zip(*pairs)])
+                coeffs_product = cvxopt.spdiag(other.coeffs[j]) * S * self.coeffs
             return self.__class__(basis, T.dot(coeffs_product))
         else:
             try:
@@ -512,6 +858,69 @@ class BSpline(Spline):
         return self.__class__(basis, self.coeffs)
 
 
+
+class SplineArray(object):
+    """A set of splines in one basis, e.g. the trajectory of a vehicle in
+    each dimension, stored as one (n_coeffs x n_splines) coefficient matrix.
+
+    Indexing and iteration return BSplines of which the coefficients are views
+    on the columns of the coefficient matrix, such that a SplineArray can be
+    used wherever a list of BSplines is expected.
+    """
+    __slots__ = ('basis', 'coeffs')
+
+    def __init__(self, basis, coeffs):
+        self.basis = basis
+        self.coeffs = np.asarray(coeffs, dtype=float).reshape(len(basis), -1)
+
+    @classmethod
+    def from_splines(cls, splines):
+        """Stack a list of BSplines which share the same basis"""
+        basis = splines[0].basis
+        if any(s.basis != basis for s in splines[1:]):
+            raise ValueError('All splines should have the same basis.')
+        coeffs = [np.asarray(s.coeffs, dtype=float).ravel() for s in splines]
+        return cls(basis, np.column_stack(coeffs))
+
+    def __len__(self):
+        return self.coeffs.shape[1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SplineArray(self.basis, self.coeffs[:, index])
+        return BSpline(self.basis, self.coeffs[:, index])
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def __call__(self, x):
+        """Evaluate all splines at x, the result has shape
+        (len(x), len(self))"""
+        return self.basis(x).dot(self.coeffs)
+
+    def sample(self, x, o=0):
+        """Evaluate the o-th derivative of all splines at x, extrapolating
+        outside the domain as splev does"""
+        return self.basis.design_matrix(x, o).dot(self.coeffs)
+
+    def derivative(self, o=1):
+        if o == 0:
+            return self
+        Bd, Pd = self.basis.derivative(o=o)
+        return SplineArray(Bd, Pd.dot(self.coeffs))
+
+    def insert_knots(self, knots):
+        """Returns an equivalent spline array with knot insertion"""
+        basis = self.basis.insert_knots(knots)
+        return SplineArray(basis, basis.transform(self.basis).dot(self.coeffs))
+
+    def scale(self, factor, shift=0):
+        return SplineArray(self.basis.scale(factor, shift=shift), self.coeffs)
+
+    def tolist(self):
+        return list(self)
+
 class Nurbs(Spline):
     def __init__(self, basis, coeffs):
         super(Nurbs, self).__init__(basis, coeffs)
@@ -536,14 +945,11 @@ class Nurbs(Spline):
             # The denominator
             denom2 = self.denom ** 2
             # coeffs of the numerator
-            pairs, S = b.pairs(db)
+            basis_product, T, i, j = b.product(db)
             dnum = self.num.derivative()
             ddenom = self.denom.derivative()
-            coeffs_product = dnum.coeffs[pairs[1].tolist()] * self.denom.coeffs[pairs[0].tolist()] - self.num.coeffs[pairs[0].tolist()] * ddenom.coeffs[pairs[1].tolist()]
-            bx = b(denom2.basis._x)
-            dbx = db(denom2.basis._x)
-            basis_product = bx[:, pairs[0]].multiply(dbx[:, pairs[1]])
-            T = denom2.basis.transform(lambda y: basis_product.toarray()[y, :])
+            coeffs_product = dnum.coeffs[j] * self.denom.coeffs[i] - self.num.coeffs[i] * ddenom.coeffs[j]
+            T = csr_matrix_alt(denom2.basis.transform(basis_product).dot(T))
             coeffs = T.dot(coeffs_product) / denom2.coeffs
             basis = NurbsBasis(denom2.basis.knots, denom2.basis.degree, denom2.coeffs)
             return self.__class__(basis, coeffs)
@@ -17,18 +17,71 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
-from .spline import BSpline, BSplineBasis
-from casadi import SX, MX, mtimes, Function, vertcat
-from scipy.interpolate import splev
+from .spline import BSpline, BSplineBasis, SplineArray, eval_nonzero_basis
+from .spline import csr_matrix_alt
+from .cache import LRUCache
+from casadi import SX, MX, DM, mtimes, Function, vertcat, reshape, dot
 import scipy.linalg as la
 import numpy as np
 
 import warnings
 
-def evalspline(s, x):
+# The shift and extrapolation transforms of the receding horizon problems are
+# rebuilt for the same bases at every update, so they are cached. Numeric
+# shifts are rounded to a multiple of SHIFT_RESOLUTION (if not None) before
+# they are used, such that shifts which only differ by round-off share an
+# entry.
+SHIFT_RESOLUTION = None
+_shift_cache = LRUCache('shift')
+
+
+def set_shift_resolution(resolution):
+    global SHIFT_RESOLUTION
+    SHIFT_RESOLUTION = resolution
+
+
+def _quantize(t):
+    t = float(t)
+    if SHIFT_RESOLUTION is not None:
+        t = round(t/SHIFT_RESOLUTION)*SHIFT_RESOLUTION
+    return t
+
+
+def evalspline(s, x, mode='piecewise'):
     # Evaluate spline with symbolic variable
-    # This is possible not the best way to implement this. The conditional node
-    # from casadi should be considered
+    # In the default 'piecewise' mode, the spline is written in its piecewise
+    # polynomial form, of which the coefficients are a cached linear map of the
+    # spline coefficients. All pieces are evaluated at once with Horner's rule
+    # and the piece containing x is selected with one vector of comparisons.
+    # This gives an expression graph with a fixed number of nodes, without
+    # divisions. Mode 'recursive' builds the Cox-de Boor recursion instead.
+    # In both modes, knot intervals are closed on the right (the first one on
+    # both sides) and the spline is zero outside its domain.
+    if not isinstance(x, (SX, MX)):
+        # numeric point: only the coefficients are symbolic
+        return s.basis(np.array([x], dtype=float)).dot(s.coeffs)[0]
+    if mode == 'recursive':
+        return _evalspline_recursive(s, x)
+    if mode != 'piecewise':
+        raise ValueError('Mode ' + mode + ' is not supported.')
+    breaks, P = s.basis.piecewise_polynomial()
+    degree, n_pieces = s.basis.degree, len(breaks) - 1
+    poly = P.dot(s.coeffs)
+    if not isinstance(poly, (SX, MX)):
+        poly = DM(poly)
+    poly = reshape(poly, degree + 1, n_pieces)
+    lower, upper = DM(breaks[:-1]), DM(breaks[1:])
+    first = DM.zeros(n_pieces)
+    first[0] = 1.
+    inside = (x > lower)*(x <= upper) + first*(x == breaks[0])
+    dx = x - lower
+    value = poly[degree, :].T
+    for m in range(degree - 1, -1, -1):
+        value = value*dx + poly[m, :].T
+    return dot(inside, value)
+
+
+def _evalspline_recursive(s, x):
     Bl = s.basis
     coeffs = s.coeffs
     k = Bl.knots
@@ -107,6 +160,15 @@ def extrapolate(coeffs, t_extra, basis):
 def extrapolate_T(basis, t_extra):
     # Create transformation matrix that extrapolates the spline over an extra
     # knot interval of t_extra long.
+    t_extra = _quantize(t_extra)
+    key = ('extrapolate', basis, t_extra)
+    T = _shift_cache.get(key)
+    if T is None:
+        T = _shift_cache[key] = csr_matrix_alt(_extrapolate_T(basis, t_extra))
+    return T
+
+
+def _extrapolate_T(basis, t_extra):
     knots = basis.knots
     deg = basis.degree
     N = len(basis)
@@ -166,6 +228,14 @@ def shiftoverknot_T(basis):
     # Create transformation matrix that moves the horizon to
     # [knot[degree+1], T+knots[-1]-knots[-deg-2]]. The spline is extrapolated
     # over the last knot interval.
+    key = ('overknot', basis)
+    T = _shift_cache.get(key)
+    if T is None:
+        T = _shift_cache[key] = csr_matrix_alt(_shiftoverknot_T(basis))
+    return T
+
+
+def _shiftoverknot_T(basis):
     knots = basis.knots
     deg = basis.degree
     m = 1  # number of repeating internal knots
@@ -186,18 +256,14 @@ def shiftoverknot_T(basis):
                 _t[j, j] = (t_shift-knots[j])/(knots[j+deg-k]-knots[j])
         _T = _t.dot(_T)
     T[:deg, :deg+1] = _T[deg+1:, :]
-    T_extr = extrapolate_T(basis, knots[-1] - knots[-deg-2])
+    T_extr = _extrapolate_T(basis, _quantize(knots[-1] - knots[-deg-2]))
     T[-(deg+1):, -(deg+1):] = T_extr[-(deg+1):, -(deg+1):]
     return T
 
 
 def shift_knot1_fwd(cfs, basis, t_shift):
     if isinstance(cfs, (SX, MX)):
-        cfs_sym = MX.sym('cfs', cfs.shape)
-        t_shift_sym = MX.sym('t_shift')
-        T = shiftfirstknot_T(basis, t_shift_sym)
-        cfs2_sym = mtimes(T, cfs_sym)
-        fun = Function('fun', [cfs_sym, t_shift_sym], [cfs2_sym]).expand()
+        fun = _shift_knot1_fun(basis, cfs.shape, MX, False)
         return fun(cfs, t_shift)
     else:
         T = shiftfirstknot_T(basis, t_shift)
@@ -206,21 +272,47 @@ def shift_knot1_fwd(cfs, basis, t_shift):
 
 def shift_knot1_bwd(cfs, basis, t_shift):
     if isinstance(cfs, (SX, MX)):
-        cfs_sym = SX.sym('cfs', cfs.shape)
-        t_shift_sym = SX.sym('t_shift')
-        _, Tinv = shiftfirstknot_T(basis, t_shift_sym, inverse=True)
-        cfs2_sym = mtimes(Tinv, cfs_sym)
-        fun = Function('fun', [cfs_sym, t_shift_sym], [cfs2_sym]).expand()
+        fun = _shift_knot1_fun(basis, cfs.shape, SX, True)
         return fun(cfs, t_shift)
     else:
         _, Tinv = shiftfirstknot_T(basis, t_shift, inverse=True)
         return Tinv.dot(cfs)
 
 
+def _shift_knot1_fun(basis, shape, typ, inverse):
+    # expanded function (cfs, t_shift) -> shifted cfs, for symbolic t_shift
+    key = ('knot1', basis, shape, typ.__name__, inverse)
+    fun = _shift_cache.get(key)
+    if fun is None:
+        cfs_sym = typ.sym('cfs', shape)
+        t_shift_sym = typ.sym('t_shift')
+        T = shiftfirstknot_T(basis, t_shift_sym, inverse)
+        cfs2_sym = mtimes(T[1] if inverse else T, cfs_sym)
+        fun = Function('fun', [cfs_sym, t_shift_sym], [cfs2_sym]).expand()
+        _shift_cache[key] = fun
+    return fun
+
+
 def shiftfirstknot_T(basis, t_shift, inverse=False):
     # Create transformation matrix that shifts the first (degree+1) knots over
     # t_shift. With inverse = True, the inverse transformation is also
     # computed.
+    if isinstance(t_shift, (SX, MX)):
+        return _shiftfirstknot_T(basis, t_shift, inverse)
+    t_shift = _quantize(t_shift)
+    key = ('firstknot', basis, t_shift, inverse)
+    T = _shift_cache.get(key)
+    if T is None:
+        T = _shiftfirstknot_T(basis, t_shift, inverse)
+        if inverse:
+            T = tuple(csr_matrix_alt(t) for t in T)
+        else:
+            T = csr_matrix_alt(T)
+        _shift_cache[key] = T
+    return T
+
+
+def _shiftfirstknot_T(basis, t_shift, inverse=False):
     knots, deg = basis.knots, basis.degree
     N = len(basis)
     if isinstance(t_shift, SX):
@@ -255,29 +347,23 @@ def shiftfirstknot_T(basis, t_shift, inverse=False):
         return T
 
 
+def prewarm_shift_transforms(bases, t_shifts=(), t_extras=()):
+    # Fill the shift cache for the given bases: the shift over the first knot
+    # interval, and the shifts of the first knots/extrapolations over each of
+    # t_shifts/t_extras.
+    for basis in bases:
+        shiftoverknot_T(basis)
+        for t_shift in t_shifts:
+            shiftfirstknot_T(basis, t_shift, inverse=True)
+        for t_extra in t_extras:
+            extrapolate_T(basis, t_extra)
+
+
 def knot_insertion_T(basis, knots_to_insert):
     # Create transformation matrix that transforms spline after inserting knots
-    N = len(basis)
-    knots = basis.knots.tolist()
-    degree = basis.degree
-    T = np.eye(N)
-    for knot in knots_to_insert:
-        _T = np.zeros((N+1, N))
-        for j in range(N+1):
-            if knot <= knots[j]:
-                w = 0.
-            elif knots[j] < knot and knot < knots[j+degree+1-1]:
-                w = (knot - knots[j])/(knots[j+degree+1-1] - knots[j])
-            else:
-                w = 1.
-            if j != 0:
-                _T[j, j-1] = (1.-w)
-            if j != N:
-                _T[j, j] = w
-        T = _T.dot(T)
-        N += 1
-        knots = sorted(knots + [knot])
-    return T, knots
+    knots = np.sort(np.r_[basis.knots, knots_to_insert])
+    T = BSplineBasis(knots, basis.degree).transform(basis)
+    return T.toarray(), knots.tolist()
 
 
 def get_interval_T(basis, min_value, max_value):
@@ -285,14 +371,11 @@ def get_interval_T(basis, min_value, max_value):
     # to max_value
     knots = basis.knots
     degree = basis.degree
-    n_min = len(np.where(knots == min_value)[0])
-    n_max = len(np.where(knots == max_value)[0])
-    min_knots = [min_value]*(degree + 1 - n_min)
-    max_knots = [max_value]*(degree + 1 - n_max)
-    T, knots2 = knot_insertion_T(basis, min_knots+max_knots)
-    jmin = np.searchsorted(knots2, min_value, side='left')
-    jmax = np.searchsorted(knots2, max_value, side='right')
-    return T[jmin:jmax-degree-1, :], knots2[jmin:jmax]
+    inner_knots = knots[(knots > min_value) & (knots < max_value)]
+    knots2 = np.r_[[min_value]*(degree + 1), inner_knots,
+                   [max_value]*(degree + 1)]
+    T = BSplineBasis(knots2, degree).transform(basis)
+    return T.toarray(), knots2.tolist()
 
 
 def crop_spline(spline, min_value, max_value):
@@ -306,108 +389,146 @@ def crop_spline(spline, min_value, max_value):
 
 
 def concat_splines(segments, segment_times, n_insert=None):
-    # While concatenating check continuity of segments, this determines
-    # the required amount of knots to insert. If segments are continuous
-    # up to degree, no extra knots are required. If they are not continuous
-    # at all, degree+1 knots are inserted in between the splines.
-    spl0 = segments[0]
-    knots = [s.basis.knots*segment_times[0] for s in spl0]  # give dimensions
-    degree = [s.basis.degree for s in spl0]
-    coeffs = [s.coeffs for s in spl0]
-    prev_segment = [s.scale(segment_times[0], shift=0) for s in spl0]  # save the combined segment until now (with dimenions)
-    prev_time = segment_times[0]  # save the motion time of combined segment
-    for k in range(1, len(segments)):
-        for l, s in enumerate(segments[k]):
-            if s.basis.degree != degree[l]:
-                # all concatenated splines should be of the same degree
-                raise ValueError(
-                    'Splines at index ' + l + 'should have same degree.')
-            if n_insert is None:
-                # check continuity, n_insert can be different for each l
-                n_insert = degree[l]+1  # starts at max value
-                for d in range(degree[l]+1):
-                    # use ipopt default tolerance as a treshold for check (1e-3)
-                    # give dimensions, to compare using the same time scale
-                    # use scale function to give segments[k][l] dimensions
-                    # prev_segment already has dimensions
-
-                    # Todo: sometimes this check fails, or you get 1e-10 and 1e-11 values that should actually be equal
-                    # this seems due to the finite tolerance of ipopt? and due to the fact that these are floating point numbers
-                    val1 = segments[k][l].scale(segment_times[k], shift = prev_time).derivative(d)(prev_time)
-                    val2 = prev_segment[l].derivative(d)(prev_time)
-                    if ( abs(val1 - val2)*0.5/(val1 + val2) <= 1e-3):
-                        # more continuity = insert less knots
-                        n_insert -= 1
-                    else:
-                        # spline values were not equal, stop comparing and use latest n_insert value
-                        break
-            # else:  # keep n_insert from input
-
-            if n_insert!= degree[l]+1:
-                # concatenation requires re-computing the coefficients and/or adding extra knots
-                # here we make the knot vector and coeffs of the total spline (the final output),
-                # but we also compute the knot vector and coeffs for concatenating just two splines,
-                # to limit the size of the system that we need to solve
-                # i.e.: when concatenating 3 splines, we first concatenate segments 1 and 2,
-                # and afterwards segments 2 and 3, this happens due to the main for loop
-
-                # make total knot vector
-                end_idx = len(knots[l])-(degree[l]+1)+n_insert
-                knots[l] = np.r_[
-                    knots[l][:end_idx], s.basis.knots[degree[l]+1:]*segment_times[k] + knots[l][-1]]  # last term = time shift
-
-                # make knot vector for two segments to concatenate
-                end_idx_concat = len(prev_segment[l].basis.knots)-(degree[l]+1)+n_insert
-                knots1 = prev_segment[l].basis.knots[:end_idx_concat]
-                knots2 = s.basis.knots[degree[l]+1:]*segment_times[k] + knots1[-1]  # last term = time shift
-                knots_concat = np.r_[knots1, knots2]
-
-                # make union basis for two segments to concatenate
-                basis_concat = BSplineBasis(knots_concat, degree[l])
-                grev_bc = basis_concat.greville()
-                # shift first and last greville point inwards, to avoid numerical problems,
-                # in which the spline evaluates to 0 because the evaluation lies just outside the domain
-                grev_bc[0] = grev_bc[0] + (grev_bc[1]-grev_bc[0])*0.01
-                grev_bc[-1] = grev_bc[-1] - (grev_bc[-1]-grev_bc[-2])*0.01
-                # evaluate basis on its greville points
-                eval_bc = basis_concat(grev_bc).toarray()
-
-                # only the last degree coeffs of segment1 and the first degree coeffs
-                # of segment2 will change --> we can reduce the size of the system to solve
-                # Todo: implement this reduction
-
-                # first give the segment dimensions, by scaling it and shifting it appropriatly
-                # this is necessary, since by default the domain is [0,1]
-                # then evaluate the splines that you want to concatenate on greville points
-                # of union basis, will give 0 outside their domain
-                s_1 = prev_segment[l](grev_bc)
-                s_2 = segments[k][l].scale(segment_times[k], shift = prev_time)(grev_bc)
-                # sum to get total evaluation
-                eval_sc = s_1 + s_2
-
-                # solve system to find new coeffs
-                coeffs_concat = la.solve(eval_bc, eval_sc)
-                # save new coefficients
-                coeffs[l] = coeffs_concat
-            else:
-                #there was no continuity, just compute new knot vector and stack coefficients
-                knots[l] = np.r_[
-                           knots[l], s.basis.knots[degree[l]+1:]*segment_times[k] + knots[l][-1]]
-                coeffs[l] = np.r_[coeffs[l], s.coeffs]
-        # going to next segment, update time shift
-        new_bases = [BSplineBasis(knots[l], degree[l])for l in range(len(segments[0]))]
-        prev_segment = [BSpline(new_bases[l], coeffs[l]) for l in range(len(segments[0]))]
-        prev_time += segment_times[k]
-
-    bases = [BSplineBasis(knots[l], degree[l])
-             for l in range(len(segments[0]))]
-    return [BSpline(bases[l], coeffs[l]) for l in range(len(segments[0]))]
+    # Concatenate spline segments, each defined on [0, 1] and lasting
+    # segment_times[k]. While concatenating, check continuity of segments,
+    # this determines the required amount of knots to insert. If segments are
+    # continuous up to degree, no extra knots are required. If they are not
+    # continuous at all, degree+1 knots are inserted in between the splines.
+    # All dimensions that share a basis are concatenated at once.
+    if all(all(s.basis == segment[0].basis for s in segment)
+           for segment in segments):
+        bases = [segment[0].basis for segment in segments]
+        coeffs = [np.column_stack([np.asarray(s.coeffs, dtype=float).ravel()
+                                   for s in segment]) for segment in segments]
+        basis, coeffs = _concat_coeffs(bases, coeffs, segment_times, n_insert)
+        return SplineArray(basis, coeffs)
+    splines = []
+    for l in range(len(segments[0])):
+        bases = [segment[l].basis for segment in segments]
+        coeffs = [np.asarray(segment[l].coeffs, dtype=float).reshape(-1, 1)
+                  for segment in segments]
+        basis, coeffs = _concat_coeffs(bases, coeffs, segment_times, n_insert)
+        splines.append(BSpline(basis, coeffs[:, 0]))
+    return splines
+
+
+def _concat_coeffs(bases, coeffs, segment_times, n_insert):
+    # Only the coefficients of the basis functions which span a joint differ
+    # from those of the segments. These are fitted on the knot intervals
+    # around the joint, which makes the cost linear in the number of segments.
+    degree = bases[0].degree
+    if any(basis.degree != degree for basis in bases):
+        # all concatenated splines should be of the same degree
+        raise ValueError('All segments should have the same degree.')
+    knots = (bases[0].knots*segment_times[0]).tolist()
+    rows = list(coeffs[0])
+    t_joint = segment_times[0]
+    for k in range(1, len(bases)):
+        # give the segment dimensions: scale and shift its knots
+        knots_k = bases[k].knots*segment_times[k] + t_joint
+        # near the joint, only the last degree+1 coefficients of the combined
+        # spline and the first degree+1 of the segment are nonzero
+        tail_knots = np.array(knots[-(2*degree + 2):])
+        tail = np.array(rows[-(degree + 1):])
+        head_knots = knots_k[:2*degree + 2]
+        head = coeffs[k][:degree + 1]
+        if n_insert is None:
+            n_ins = degree + 1 - _continuity(
+                tail_knots, tail, head_knots, head, degree, t_joint)
+        else:
+            n_ins = n_insert
+        # number of coefficients of basis functions which span the joint
+        n_joint = degree + 1 - n_ins
+        if n_joint > 0:
+            middle = _fit_joint(tail_knots, tail, head_knots, head, degree,
+                                n_joint)
+            del knots[-n_joint:]
+            del rows[-n_joint:]
+            rows.extend(middle)
+        rows.extend(coeffs[k][n_joint:])
+        knots.extend(knots_k[degree + 1:])
+        t_joint += segment_times[k]
+    return BSplineBasis(knots, degree), np.array(rows)
+
+
+def _local_derivatives(knots, coeffs, degree, x, o=0):
+    # Evaluate the o-th derivative at x of the spline piece on knot interval
+    # [knots[degree], knots[degree+1]], which only involves the degree+1
+    # coefficients of the basis functions defined by these 2*degree+2 knots.
+    span = degree*np.ones(len(x), dtype=int)
+    return eval_nonzero_basis(knots, degree, x, span, o).dot(coeffs)
+
+
+def _continuity(tail_knots, tail, head_knots, head, degree, t_joint):
+    # Number of derivatives, starting from order 0, which are continuous at
+    # the joint for all dimensions. Use ipopt default tolerance as a threshold
+    # for the relative difference (1e-3). Values of opposite sign are never
+    # considered equal, inserting a knot too many is harmless.
+    x = np.array([t_joint])
+    continuity = 0
+    for d in range(degree + 1):
+        val1 = _local_derivatives(head_knots, head, degree, x, d)
+        val2 = _local_derivatives(tail_knots, tail, degree, x, d)
+        if not np.all(abs(val1 - val2) <= 1e-3*0.5*abs(val1 + val2)):
+            break
+        continuity += 1
+    return continuity
+
+
+def _fit_joint(tail_knots, tail, head_knots, head, degree, n_joint):
+    # In the knot vector of the union, the joint has multiplicity
+    # degree+1-n_joint. The n_joint basis functions that span it are fitted to
+    # the combined spline and the segment on the knot interval at either side
+    # of the joint, given the unchanged coefficients of their neighbours.
+    knots = np.r_[tail_knots[:-n_joint], head_knots[degree + 1:]]
+    n_side = degree + 1 - n_joint
+    x_left = np.linspace(tail_knots[degree], tail_knots[degree + 1],
+                         degree + 3)[1:-1]
+    x_right = np.linspace(head_knots[degree], head_knots[degree + 1],
+                          degree + 3)[1:-1]
+    x = np.r_[x_left, x_right]
+    values = np.r_[_local_derivatives(tail_knots, tail, degree, x_left),
+                   _local_derivatives(head_knots, head, degree, x_right)]
+    span = np.clip(np.searchsorted(knots, x, side='right') - 1,
+                   degree, len(knots) - degree - 2)
+    A = np.zeros((len(x), len(knots) - degree - 1))
+    np.put_along_axis(A, span[:, None] - degree + np.arange(degree + 1),
+                      eval_nonzero_basis(knots, degree, x, span), axis=1)
+    values -= (A[:, :n_side].dot(tail[:n_side]) +
+               A[:, n_side + n_joint:].dot(head[n_joint:]))
+    return la.lstsq(A[:, n_side:n_side + n_joint], values)[0]
+
 
 def sample_splines(spline, time):
-    if isinstance(spline, list):
-        return [splev(time, (s.basis.knots, s.coeffs, s.basis.degree)) for s in spline]
+    if isinstance(spline, (list, SplineArray)):
+        return sample_derivatives(spline, time, 0)[0]
     else:
-        return splev(time, (spline.basis.knots, spline.coeffs, spline.basis.degree))
+        return sample_derivatives([spline], time, 0)[0][0]
+
+
+def sample_derivatives(splines, time, order):
+    # Sample splines and their derivatives up to order on time. Splines which
+    # share a basis are evaluated at once: per derivative order, the cached
+    # sparse design matrix of the basis on time is multiplied with the matrix
+    # of stacked coefficients. Returns a list with for each order 0..order a
+    # list of sampled splines. As for splev, the splines are extrapolated
+    # outside their domain.
+    shape = np.shape(time)
+    if isinstance(splines, SplineArray):
+        return [[values.reshape(shape) for values in splines.sample(time, o).T]
+                for o in range(order+1)]
+    groups = {}
+    for l, s in enumerate(splines):
+        groups.setdefault(s.basis, []).append(l)
+    samples = [[None]*len(splines) for _ in range(order+1)]
+    for basis, index in groups.items():
+        coeffs = np.column_stack([np.asarray(splines[l].coeffs, dtype=float).ravel()
+                                  for l in index])
+        for o in range(order+1):
+            values = basis.design_matrix(time, o).dot(coeffs)
+            for k, l in enumerate(index):
+                samples[o][l] = values[:, k].reshape(shape)
+    return samples
 
 
 # def integral_sqbasis(basis):
@@ -0,0 +1,141 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Iteration-level statistics of the nlp solves.
+
+During a solve, casadi stores the state of every ipopt iteration (reported by
+the intermediate callback of ipopt) in stats()['iterations']. A
+SolverTelemetry keeps these iterates of the last solves in a ring buffer of
+fixed size:
+
+    problem.set_options({'telemetry': True})  # or the buffer size
+    ...
+    print(problem.telemetry.summary())
+    problem.telemetry.export_csv('iterations.csv')
+"""
+
+from collections import OrderedDict
+import json
+import numpy as np
+
+FIELDS = ('obj', 'inf_pr', 'inf_du', 'mu', 'd_norm', 'alpha_pr', 'alpha_du',
+          'regularization_size')
+COLUMNS = ('solve', 'iter') + FIELDS
+DEFAULT_CAPACITY = 4096
+
+
+class SolverTelemetry(object):
+    """Ring buffer with the iterates of the last solves
+
+    Args:
+        capacity (int): number of iterations that is kept
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._buffer = np.zeros((capacity, len(COLUMNS)))
+        self._n = 0  # number of rows ever written
+        self.n_solves = 0
+
+    def __len__(self):
+        return min(self._n, self.capacity)
+
+    def record(self, stats):
+        """Add the iterations of a solve, given the stats() of the solver"""
+        solve = self.n_solves
+        self.n_solves += 1
+        iterations = stats.get('iterations')
+        if not iterations or not iterations.get('obj'):
+            return
+        n_iter = len(iterations['obj'])
+        rows = np.empty((n_iter, len(COLUMNS)))
+        rows[:, 0] = solve
+        rows[:, 1] = np.arange(n_iter)
+        for k, field in enumerate(FIELDS):
+            rows[:, k+2] = iterations.get(field, np.nan)
+        rows = rows[-self.capacity:]
+        start = self._n % self.capacity
+        end = start + rows.shape[0]
+        if end <= self.capacity:
+            self._buffer[start:end] = rows
+        else:
+            split = self.capacity - start
+            self._buffer[start:] = rows[:split]
+            self._buffer[:end-self.capacity] = rows[split:]
+        self._n += rows.shape[0]
+
+    def data(self):
+        """Return the stored iterations as a dictionary of arrays (one per
+        column), in chronological order"""
+        if self._n <= self.capacity:
+            rows = self._buffer[:self._n]
+        else:
+            start = self._n % self.capacity
+            rows = np.r_[self._buffer[start:], self._buffer[:start]]
+        data = OrderedDict()
+        for k, column in enumerate(COLUMNS):
+            data[column] = rows[:, k].astype(int) if k < 2 else rows[:, k]
+        return data
+
+    def summary(self):
+        """Statistics over the (completely) stored solves
+
+        Solves without iterates, such as the sqpmethod steps of the rti
+        mode, are only counted in n_solves of the SolverTelemetry.
+        """
+        data = self.data()
+        solves, first = np.unique(data['solve'], return_index=True)
+        if len(self) == self.capacity and len(solves) > 1:
+            # the oldest solve can be partially overwritten
+            solves, first = solves[1:], first[1:]
+        last = np.r_[first[1:], len(data['solve'])] - 1
+        if len(solves) == 0:
+            return OrderedDict([('n_solves', 0)])
+        n_iter = data['iter'][last]
+        # the first row of a solve is its initial point, not a step
+        steps = (np.arange(len(data['iter'])) >= first[0]) & (data['iter'] > 0)
+        summary = OrderedDict()
+        summary['n_solves'] = len(solves)
+        summary['iter_mean'] = float(np.mean(n_iter))
+        summary['iter_max'] = int(np.max(n_iter))
+        summary['inf_pr_init'] = float(np.mean(data['inf_pr'][first]))
+        summary['inf_du_init'] = float(np.mean(data['inf_du'][first]))
+        summary['inf_pr_final'] = float(np.mean(data['inf_pr'][last]))
+        summary['inf_du_final'] = float(np.mean(data['inf_du'][last]))
+        if np.any(steps):
+            summary['alpha_pr_mean'] = float(np.mean(data['alpha_pr'][steps]))
+            summary['alpha_du_mean'] = float(np.mean(data['alpha_du'][steps]))
+            summary['full_steps'] = float(np.mean(data['alpha_pr'][steps] == 1.))
+        return summary
+
+    def export_csv(self, path):
+        data = self.data()
+        np.savetxt(path, np.column_stack(list(data.values())), fmt='%.10g',
+                   delimiter=',', header=','.join(COLUMNS), comments='')
+
+    def export_json(self, path):
+        data = self.data()
+        with open(path, 'w') as f:
+            json.dump({'columns': dict((c, v.tolist())
+                                       for c, v in data.items()),
+                       'summary': self.summary()}, f)
+
+    def clear(self):
+        self._n = 0
+        self.n_solves = 0
@@ -1,3 +1,3 @@
 from .environment import Environment
-from .obstacle import Obstacle
+from .obstacle import Obstacle, ObstacleSlot, ObstacleSet
 from .frame import ShiftFrame, CorridorFrame
@@ -20,7 +20,7 @@
 from ..basics.optilayer import OptiChild
 from ..basics.spline import BSplineBasis, BSpline
 from ..execution.plotlayer import PlotLayer, mix_with_white
-from .obstacle import Obstacle
+from .obstacle import Obstacle, ObstacleSlot, ObstacleSlotxD, ObstacleSet
 from casadi import inf
 import numpy as np
 import warnings
@@ -28,10 +28,16 @@ import warnings
 
 class Environment(OptiChild, PlotLayer):
 
-    def __init__(self, room, obstacles=None):
+    def __init__(self, room, obstacles=None, parametric_rooms=False):
         obstacles = obstacles or []
+        if isinstance(obstacles, ObstacleSet):
+            obstacles = [obstacles]
         OptiChild.__init__(self, 'environment')
         PlotLayer.__init__(self)
+        # pass the room geometry to the constraints as parameters instead of
+        # constants, such that problems in rooms with a different geometry
+        # have the same nlp
+        self.parametric_rooms = parametric_rooms
 
         # create rooms and define dimension of the space
         # note: in general self.room may contain a list of several rooms, this is the case for
@@ -57,6 +63,12 @@ class Environment(OptiChild, PlotLayer):
 
         # add obstacles
         self.obstacles, self.n_obs = [], 0
+        self.slots = []  # obstacle slots, see add_obstacle_slots
+        self.obstacle_sets = []  # obstacles that share their parameters
+        # only avoid the obstacles that the vehicles can reach within
+        # reach_time, None avoids all obstacles
+        self.reach_time = None
+        self.candidates, self.avoided = {}, {}  # per vehicle
         for obstacle in obstacles:
             self.add_obstacle(obstacle)
 
@@ -65,9 +77,21 @@ class Environment(OptiChild, PlotLayer):
     # ========================================================================
 
     def copy(self):
-        obstacles = [Obstacle(o.initial, o.shape, o.simulation, o.options)
-                     for o in self.obstacles]
-        return Environment(self.room, obstacles)
+        copies = {o: Obstacle(o.initial, o.shape, o.simulation, o.options)
+                  for o in self.obstacles}
+        pooled = self.get_pooled_obstacles()
+        grouped = self.get_grouped_obstacles()
+        environment = Environment(
+            self.room, [copies[o] for o in self.obstacles
+                        if o not in pooled and o not in grouped],
+            self.parametric_rooms)
+        for obstacle_set in self.obstacle_sets:
+            environment.add_obstacle(ObstacleSet(
+                [copies[o] for o in obstacle_set.obstacles], obstacle_set.options))
+        for slot in self.slots:
+            environment.add_obstacle_slots(slot.shape, 1, slot.options)
+        environment.add_obstacle([copies[o] for o in self.obstacles if o in pooled])
+        return environment
 
     # ========================================================================
     # Add obstacles/vehicles
@@ -87,9 +111,73 @@ class Environment(OptiChild, PlotLayer):
                 raise ValueError('Not possible to combine ' +
                                  str(obstacle.n_dim) + 'D obstacle with ' +
                                  str(self.n_dim) + 'D environment.')
+            if isinstance(obstacle, ObstacleSet):
+                # the obstacles of the set are simulated and drawn as usual
+                self.obstacle_sets.append(obstacle)
+                self.obstacles.extend(obstacle.obstacles)
+                self.n_obs += obstacle.n_obs
+                return
+            # fill a free slot if there is one for this obstacle
+            for slot in self.slots:
+                if slot.accepts(obstacle):
+                    slot.fill(obstacle)
+                    break
             self.obstacles.append(obstacle)
             self.n_obs += 1
 
+    def remove_obstacle(self, obstacle):
+        if isinstance(obstacle, list):
+            for obst in obstacle:
+                self.remove_obstacle(obst)
+        else:
+            if obstacle in self.get_grouped_obstacles():
+                raise ValueError('Not possible to remove an obstacle ' +
+                                 'that is part of an ObstacleSet.')
+            for slot in self.slots:
+                if slot.obstacle is obstacle:
+                    slot.release()
+                    break
+            else:
+                warnings.warn('Removing an obstacle that does not occupy ' +
+                              'an obstacle slot only has effect after ' +
+                              'rebuilding the problem.')
+            self.obstacles.remove(obstacle)
+            self.n_obs -= 1
+
+    def add_obstacle_slots(self, shape, n_slots, options=None):
+        # Reserve n_slots places in the problem for obstacles with the same
+        # shape type and number of checkpoints as shape. Obstacles that are
+        # added (or removed) afterwards fill (or free) a slot, which does not
+        # require to rebuild the problem. Create the slots before the problem.
+        # Obstacles in a slot keep their orientation over the horizon.
+        if shape.n_dim == 3 and self.n_dim == 2:
+            raise ValueError('Not possible to combine ' +
+                             str(shape.n_dim) + 'D obstacle with ' +
+                             str(self.n_dim) + 'D environment.')
+        slots = [ObstacleSlot(shape, options) for k in range(n_slots)]
+        # empty slots are parked at a distance of one room size from the rooms
+        lims = np.array([[l + room['position'][k] for k, l in
+                          enumerate(room['shape'].get_canvas_limits())]
+                         for room in self.room])
+        upper, lower = np.max(lims[:, :, 1], 0), np.min(lims[:, :, 0], 0)
+        for slot in slots:
+            slot.park_position = (2*upper - lower)[:slot.n_dim]
+        self.slots.extend(slots)
+        return slots
+
+    def get_pooled_obstacles(self):
+        return [slot.obstacle for slot in self.slots if slot.obstacle is not None]
+
+    def get_grouped_obstacles(self):
+        return [o for obstacle_set in self.obstacle_sets for o in obstacle_set.obstacles]
+
+    def get_obstacle_children(self):
+        # the obstacles that are part of the optimization problem: the slots,
+        # the obstacle sets and the obstacles that occupy neither of them
+        excluded = self.get_pooled_obstacles() + self.get_grouped_obstacles()
+        return ([o for o in self.obstacles if o not in excluded] +
+                self.obstacle_sets + self.slots)
+
     def fill_room(self, room, obstacles):
         # if key didn't exist yet, it is created
         # if key existed already, all obstacles are replaced
@@ -110,16 +198,22 @@ class Environment(OptiChild, PlotLayer):
                           vehicle.degree:-vehicle.degree],
                       np.ones(degree)]
         basis = BSplineBasis(knots, degree)
+        self.candidates[vehicle], self.avoided[vehicle] = [], []
         for idx in range(vehicle.n_seg):
             # loop over vehicle segments, not over rooms since number of considered segments
             # may be different from total number of rooms
             room = self.room[idx]  # select current room
+            if self.parametric_rooms:
+                room = self.define_room_parameters(idx)
             hyp_veh, hyp_obs = {}, {}
             # add all obstacles, unless user specified it differently
             if 'obstacles' in room:
                 obs_to_add = room['obstacles']
             else:
-                obs_to_add = self.obstacles
+                obs_to_add = self.get_obstacle_children()
+            self.candidates[vehicle] += [o for o in obs_to_add if o not in self.candidates[vehicle]]
+            reachable = self.get_reachable_obstacles(vehicle, obs_to_add)
+            self.avoided[vehicle] += [o for o in reachable if o not in self.avoided[vehicle]]
             for k, shape in enumerate(vehicle.shapes):
                 hyp_veh[shape] = []
                 for l, obstacle in enumerate(obs_to_add):
@@ -127,7 +221,19 @@ class Environment(OptiChild, PlotLayer):
                     # pass the horizon_time for current segment, and all the previous ones, allowing to
                     # gradually build up the position spline for the obstacle
                     obstacle.init(horizon_times=horizon_times[:idx+1])
-                    if obstacle.options['avoid']:
+                    if isinstance(obstacle, ObstacleSet):
+                        if obstacle.options['avoid']:
+                            hyps = self.define_obstacle_set_hyperplanes(
+                                obstacle, basis, vehicle.label+'_'+'seg'+str(idx)+'_'+str(k)+str(l))
+                            for hyp in hyps:
+                                if self.n_dim == 3 and obstacle.n_dim == 2:
+                                    a2 = [hyp['a'][0], hyp['a'][1], BSpline(basis, np.zeros(len(basis)))]
+                                    hyp_veh[shape].append({'a': a2, 'b': hyp['b']})
+                                else:
+                                    hyp_veh[shape].append(hyp)
+                            obstacle.define_collision_constraints([hyps])
+                        continue
+                    if obstacle.options['avoid'] and obstacle in reachable:
                         if obstacle not in hyp_obs:
                             hyp_obs[obstacle] = []
                         a = self.define_spline_variable(
@@ -145,6 +251,43 @@ class Environment(OptiChild, PlotLayer):
                         obstacle.define_collision_constraints(hyp_obs[obstacle])
             vehicle.define_collision_constraints(hyp_veh, room, splines[idx], horizon_times[idx])
 
+    def define_obstacle_set_hyperplanes(self, obstacle_set, basis, suffix):
+        # one matrix of spline variables holds the separating hyperplanes of
+        # all obstacles in the set, their norm is constrained by the set
+        n_dim, n_obs = obstacle_set.n_dim, obstacle_set.n_obs
+        a = self.define_spline_variable('a'+'_'+suffix, n_dim*n_obs, basis=basis)
+        b = self.define_spline_variable('b'+'_'+suffix, n_obs, basis=basis)
+        return [{'a': a[j*n_dim:(j+1)*n_dim], 'b': b[j]} for j in range(n_obs)]
+
+    def get_reachable_obstacles(self, vehicle, obstacles=None):
+        # Cull the obstacles that can not come closer to the vehicle than
+        # their size, within reach_time. The reach of the vehicle and of the
+        # obstacles (moving with constant acceleration) are bounded by balls.
+        if obstacles is None:
+            obstacles = self.candidates[vehicle]
+        reach = None if self.reach_time is None else vehicle.get_reach(self.reach_time)
+        if reach is None:
+            return list(obstacles)
+        center, radius = reach
+        T = self.reach_time
+        reachable = []
+        for obstacle in obstacles:
+            if (isinstance(obstacle, (ObstacleSlotxD, ObstacleSet)) or
+                    obstacle.options['spline_traj']):
+                # slots are kept to avoid rebuilds, sets are kept as a whole
+                reachable.append(obstacle)
+                continue
+            checkpoints, rad = obstacle.shape.get_checkpoints()
+            size = max([np.linalg.norm(c) + r for c, r in zip(checkpoints, rad)])
+            position = obstacle.signals['position'][:, -1]
+            motion = (np.linalg.norm(obstacle.signals['velocity'][:, -1])*T +
+                      0.5*np.linalg.norm(obstacle.signals['acceleration'][:, -1])*T**2)
+            n_dim = min(obstacle.n_dim, vehicle.n_dim)
+            distance = np.linalg.norm(position[:n_dim] - center[:n_dim])
+            if distance <= radius + size + motion:
+                reachable.append(obstacle)
+        return reachable
+
     def define_intervehicle_collision_constraints(self, vehicles, horizon_times):
         # Todo: added for idx in range(vehicles[0].n_seg) loop, okay?
         # For now supposed that all vehicles have the same amount of segments
@@ -171,16 +314,42 @@ class Environment(OptiChild, PlotLayer):
                                     sum([a[p]*a[p] for p in range(self.n_dim)])-1, -inf, 0.)
                                 hyp_veh[veh1][shape1].append({'a': a, 'b': b})
                                 hyp_veh[veh2][shape2].append({'a': [-a_i for a_i in a], 'b': -b})
+            room = self.room[idx]
+            if self.parametric_rooms:
+                room = self.define_room_parameters(idx)
             for vehicle in vehicles:
                 splines = vehicle.splines[idx]
-                vehicle.define_collision_constraints(hyp_veh[vehicle], self.room[idx], splines, horizon_times[idx])
+                vehicle.define_collision_constraints(hyp_veh[vehicle], room, splines, horizon_times[idx])
+
+    def define_room_parameters(self, idx):
+        # Return a copy of room idx of which the limits and hyperplanes, as
+        # used by the room constraints of the vehicles, are parameters.
+        room = dict(self.room[idx])
+        lims = room['shape'].get_canvas_limits()
+        limits = self.define_parameter(
+            'room_limits'+str(idx), self.n_dim, 2,
+            value=np.array([lims[k]+room['position'][k]
+                            for k in range(self.n_dim)]))
+        room['limits'] = [[limits[k, 0], limits[k, 1]]
+                          for k in range(self.n_dim)]
+        if self.n_dim == 2 and hasattr(room['shape'], 'get_hyperplanes'):
+            hyp = room['shape'].get_hyperplanes(position=room['position'])
+            a = self.define_parameter(
+                'room_a'+str(idx), len(hyp), 2,
+                value=np.array([hyp[k]['a'] for k in range(len(hyp))]))
+            b = self.define_parameter(
+                'room_b'+str(idx), len(hyp),
+                value=np.array([hyp[k]['b'] for k in range(len(hyp))]))
+            room['hyperplanes'] = {k: {'a': [a[k, 0], a[k, 1]], 'b': b[k]}
+                                   for k in range(len(hyp))}
+        return room
 
     # ========================================================================
     # Optimization modelling related functions
     # ========================================================================
 
     def init(self, horizon_times=None):
-        for obstacle in self.obstacles:
+        for obstacle in self.get_obstacle_children():
             obstacle.init(horizon_times=horizon_times)
 
     # ========================================================================
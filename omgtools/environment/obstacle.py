@@ -25,7 +25,7 @@ from ..basics.geometry import distance_between_points, point_in_polyhedron
 from ..basics.geometry import circle_polyhedron_intersection
 from ..basics.geometry import rectangles_overlap
 from ..basics.shape import Circle, Polyhedron, Rectangle, Square
-from casadi import inf, vertcat, cos, sin
+from casadi import inf, vertcat, horzcat, vec, cos, sin, MX, Function
 from scipy.interpolate import interp1d
 from scipy.integrate import odeint
 import numpy as np
@@ -531,3 +531,221 @@ class Obstacle3D(ObstaclexD):
             for l in range(self.checkpoints.shape[0]//self.n_dim):
                 self.define_constraint(-sum([a[k]*(self.checkpoints[l*self.shape.n_dim+k]+self.pos_spline[k])
                                              for k in range(self.n_dim)]) + b + self.rad[l], -inf, 0.)
+
+
+class ObstacleSlot(object):
+    # Placeholder for an obstacle in the optimization problem. The position,
+    # checkpoints and radii of the obstacle that fills the slot are
+    # parameters, such that obstacles can be added and removed without
+    # rebuilding the problem. An empty slot holds a point obstacle at its
+    # park position, outside of the room. See Environment.add_obstacle_slots.
+
+    def __new__(cls, shape, options=None):
+        options = options or {}
+        if shape.n_dim == 2:
+            return ObstacleSlot2D(shape, options)
+        if shape.n_dim == 3:
+            return ObstacleSlot3D(shape, options)
+
+
+class ObstacleSlotxD(object):
+
+    def __init__(self, shape, options):
+        OptiChild.__init__(self, 'slot')
+        self.set_default_options()
+        self.set_options(options)
+        self.shape = shape
+        self.n_dim = shape.n_dim
+        self.n_chck = len(shape.get_checkpoints()[0])
+        self.basis = BSplineBasis([0, 0, 0, 1, 1, 1], 2)
+        self.obstacle = None
+        self.park_position = np.zeros(self.n_dim)
+
+    # ========================================================================
+    # Fill and empty the slot
+    # ========================================================================
+
+    def accepts(self, obstacle):
+        # the obstacle should have the same number of checkpoints and move
+        # according to its position, velocity and acceleration
+        return (self.obstacle is None and obstacle.n_dim == self.n_dim and
+                type(obstacle.shape) == type(self.shape) and
+                len(obstacle.shape.get_checkpoints()[0]) == self.n_chck and
+                not obstacle.options['spline_traj'])
+
+    def fill(self, obstacle):
+        if not self.accepts(obstacle):
+            raise ValueError('Obstacle does not fit in %s.' % self.label)
+        self.obstacle = obstacle
+
+    def release(self):
+        self.obstacle = None
+
+    def is_active(self):
+        return self.obstacle is not None and self.obstacle.options['avoid']
+
+    # ========================================================================
+    # Optimization modelling related functions
+    # ========================================================================
+
+    def init(self, horizon_times=None):
+        ObstaclexD.init(self, horizon_times=horizon_times)
+        if self.n_dim == 2:
+            # the checkpoints are rotated in set_parameters
+            self.cos, self.sin, self.gon_weight = 1., 0., 1.
+
+    def set_parameters(self, current_time):
+        parameters = {self: {}}
+        if not self.is_active():
+            # relaxing the constraints of the slot would leave its separating
+            # hyperplanes undetermined, which slows down the solver
+            parameters[self]['x'] = self.park_position
+            parameters[self]['v'] = np.zeros(self.n_dim)
+            parameters[self]['a'] = np.zeros(self.n_dim)
+            parameters[self]['checkpoints'] = np.zeros(self.n_chck*self.n_dim)
+            parameters[self]['rad'] = np.zeros(self.n_chck)
+            return parameters
+        signals = self.obstacle.signals
+        parameters[self]['x'] = signals['position'][:, -1]
+        parameters[self]['v'] = signals['velocity'][:, -1]
+        parameters[self]['a'] = signals['acceleration'][:, -1]
+        checkpoints, rad = self.obstacle.shape.get_checkpoints()
+        checkpoints = np.array(checkpoints, dtype=float)
+        if self.n_dim == 2:
+            # the orientation is kept constant over the horizon
+            theta = signals['orientation'][:, -1][0]
+            rot = np.array([[np.cos(theta), -np.sin(theta)],
+                            [np.sin(theta), np.cos(theta)]])
+            checkpoints = checkpoints.dot(rot.T)
+        parameters[self]['checkpoints'] = np.reshape(checkpoints, (self.n_chck*self.n_dim, ))
+        parameters[self]['rad'] = rad
+        return parameters
+
+
+class ObstacleSlot2D(ObstacleSlotxD, Obstacle2D):
+
+    def __init__(self, shape, options):
+        ObstacleSlotxD.__init__(self, shape, options)
+
+
+class ObstacleSlot3D(ObstacleSlotxD, Obstacle3D):
+
+    def __init__(self, shape, options):
+        ObstacleSlotxD.__init__(self, shape, options)
+
+
+class ObstacleSet(OptiChild):
+    # Group of obstacles with the same shape type and number of checkpoints
+    # (and a position, velocity and acceleration). The states, checkpoints
+    # and radii of all obstacles are stacked in one parameter matrix each,
+    # and their collision constraints are the map of the constraints of a
+    # single obstacle. Obstacles in a set keep their orientation over the
+    # horizon.
+
+    def __init__(self, obstacles, options=None):
+        OptiChild.__init__(self, 'obstacleset')
+        self.options = {'avoid': True, 'spline_traj': False}
+        self.options.update(options or {})
+        self.obstacles = list(obstacles)
+        if not self.obstacles:
+            raise ValueError('An ObstacleSet needs at least one obstacle.')
+        shape = self.obstacles[0].shape
+        self.n_dim = shape.n_dim
+        self.n_obs = len(self.obstacles)
+        for obstacle in self.obstacles:
+            if (obstacle.n_dim != self.n_dim or
+                    type(obstacle.shape) != type(shape) or
+                    len(obstacle.shape.get_checkpoints()[0]) != len(shape.get_checkpoints()[0])):
+                raise ValueError('All obstacles of an ObstacleSet should ' +
+                                 'have the same shape type and number of checkpoints.')
+            if obstacle.options['spline_traj']:
+                raise ValueError('Obstacles with a spline trajectory can ' +
+                                 'not be part of an ObstacleSet.')
+        self.basis = BSplineBasis([0, 0, 0, 1, 1, 1], 2)
+        # the checkpoints in the frame of the obstacles do not change
+        checkpoints, rad = zip(*[o.shape.get_checkpoints() for o in self.obstacles])
+        self._checkpoints = np.array(checkpoints, dtype=float)  # n_obs x n_chck x n_dim
+        self._rad = np.array(rad, dtype=float).T  # n_chck x n_obs
+        self.n_chck = self._checkpoints.shape[1]
+
+    def __len__(self):
+        return self.n_obs
+
+    def __iter__(self):
+        return iter(self.obstacles)
+
+    # ========================================================================
+    # Optimization modelling related functions
+    # ========================================================================
+
+    def init(self, horizon_times=None):
+        self.x = self.define_parameter('x', self.n_dim, self.n_obs)
+        self.v = self.define_parameter('v', self.n_dim, self.n_obs)
+        self.a = self.define_parameter('a', self.n_dim, self.n_obs)
+        self.checkpoints = self.define_parameter('checkpoints', self.n_chck*self.n_dim, self.n_obs)
+        self.rad = self.define_parameter('rad', self.n_chck, self.n_obs)
+        self.t = self.define_symbol('t')
+        if horizon_times is None:
+            self.T = self.define_symbol('T')
+            horizon_times = [self.T]
+        elif not isinstance(horizon_times, list):
+            horizon_times = [horizon_times]
+        self.horizon_times = horizon_times
+
+    def _constraint_function(self, basis, n_times):
+        # constraint coefficients for a single obstacle and hyperplane
+        a_cfs = [MX.sym('a'+str(k), len(basis)) for k in range(self.n_dim)]
+        b_cfs = MX.sym('b', len(basis))
+        x, v, a = [MX.sym(name, self.n_dim) for name in ['x', 'v', 'a']]
+        checkpoints = MX.sym('checkpoints', self.n_chck*self.n_dim)
+        rad = MX.sym('rad', self.n_chck)
+        horizon_times, t = MX.sym('T', n_times), MX.sym('t')
+        # position spline of the obstacle, see ObstaclexD.init
+        v0 = v - t*a
+        pos0 = x - t*v0 - 0.5*(t**2)*a
+        for k in range(n_times):
+            T = horizon_times[k]
+            pos_spline = [BSpline(self.basis, vertcat(pos0[p], 0.5*v0[p]*T + pos0[p],
+                                                      pos0[p] + v0[p]*T + 0.5*a[p]*(T**2)))
+                          for p in range(self.n_dim)]
+            pos0 = [pos_spline[p](1) for p in range(self.n_dim)]
+        a_spl = [BSpline(basis, a_cfs[p]) for p in range(self.n_dim)]
+        b_spl = BSpline(basis, b_cfs)
+        con = []
+        for l in range(self.n_chck):
+            con.append((-sum([a_spl[p]*(checkpoints[l*self.n_dim+p]+pos_spline[p])
+                              for p in range(self.n_dim)]) + b_spl + rad[l]).coeffs)
+        norm = (sum([a_spl[p]*a_spl[p] for p in range(self.n_dim)]) - 1).coeffs
+        return Function('obstacle_set', a_cfs + [b_cfs, x, v, a, checkpoints, rad, horizon_times, t],
+                        [vertcat(*con), norm])
+
+    def define_collision_constraints(self, hyperplanes):
+        # every element of hyperplanes is a list with the hyperplane {'a', 'b'}
+        # of each obstacle in the set
+        for hyps in hyperplanes:
+            basis = hyps[0]['b'].basis
+            fun = self._constraint_function(basis, len(self.horizon_times))
+            # all obstacles share the horizon times and t
+            n_in = self.n_dim + 6
+            fun = fun.map('obstacle_set_map', 'serial', self.n_obs, [n_in, n_in+1], [])
+            a_cfs = [horzcat(*[h['a'][p].coeffs for h in hyps]) for p in range(self.n_dim)]
+            b_cfs = horzcat(*[h['b'].coeffs for h in hyps])
+            con, norm = fun(*(a_cfs + [b_cfs, self.x, self.v, self.a, self.checkpoints,
+                                      self.rad, vertcat(*self.horizon_times), self.t]))
+            self.define_constraint(vec(con), -inf, 0.)
+            self.define_constraint(vec(norm), -inf, 0.)
+
+    def set_parameters(self, current_time):
+        parameters = {self: {}}
+        for key, name in [('position', 'x'), ('velocity', 'v'), ('acceleration', 'a')]:
+            parameters[self][name] = np.array([o.signals[key][:, -1] for o in self.obstacles]).T
+        checkpoints = self._checkpoints
+        if self.n_dim == 2:
+            theta = np.array([o.signals['orientation'][0, -1] for o in self.obstacles])
+            if np.any(theta != 0.):
+                cos_t, sin_t = np.cos(theta)[:, None], np.sin(theta)[:, None]
+                checkpoints = np.stack((cos_t*checkpoints[:, :, 0] - sin_t*checkpoints[:, :, 1],
+                                        sin_t*checkpoints[:, :, 0] + cos_t*checkpoints[:, :, 1]), axis=2)
+        parameters[self]['checkpoints'] = checkpoints.reshape(self.n_obs, -1).T
+        parameters[self]['rad'] = self._rad
+        return parameters
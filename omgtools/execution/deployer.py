@@ -18,6 +18,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 import numpy as np
+from ..basics.instrumentation import timed, next_update
 from matplotlib import pyplot as plt
 
 
@@ -65,9 +66,13 @@ class Deployer:
             if (delay + int(np.round(update_time/self.sample_time, 6))) > int(np.round(float(self.problem.vehicles[0].trajectories['time'][:, -1] - self.current_time)/self.sample_time,6)):
                 delay = 0
 
-        self.problem.predict(current_time, update_time, self.sample_time, states, inputs, dinputs, delay, enforce_states, enforce_inputs)
-        self.problem.solve(current_time, update_time)
-        self.problem.store(current_time, update_time, self.sample_time)
+        next_update()
+        with timed('predict', 'deployer'):
+            self.problem.predict(current_time, update_time, self.sample_time, states, inputs, dinputs, delay, enforce_states, enforce_inputs)
+        with timed('solve', 'deployer'):
+            self.problem.solve(current_time, update_time)
+        with timed('store', 'deployer'):
+            self.problem.store(current_time, update_time, self.sample_time)
         self.current_time = current_time
         # return trajectories
         trajectories = {}
@@ -28,6 +28,7 @@ from matplotlib import animation
 from mpl_toolkits.mplot3d import Axes3D, proj3d
 import numpy as np
 from matplotlib.collections import PolyCollection
+from ..basics.instrumentation import timed
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 
 # def orthogonal_proj(zfront, zback):
@@ -248,10 +249,13 @@ class PlotLayer(object):
     def update_plots(self, plots=None, t=-1):
         plots = plots or self.plots
         plots = plots if isinstance(plots, list) else [plots]
-        for plot in plots:
-            if 'info' not in plot:
-                self._init_plot(plot)
-            self._update_plot(plot, t)
+        if not plots:
+            return
+        with timed('plot', getattr(self, 'label', '')):
+            for plot in plots:
+                if 'info' not in plot:
+                    self._init_plot(plot)
+                self._update_plot(plot, t)
 
     def _update_plot(self, plot, t=-1):
         argument, kwargs = plot['argument'], plot['kwargs']
@@ -20,6 +20,7 @@
 import numpy as np
 from .deployer import Deployer
 from .plotlayer import PlotLayer
+from ..basics.instrumentation import timed
 
 
 class Simulator:
@@ -93,9 +94,11 @@ class Simulator:
         # update deployer
         self.deployer.update(self.current_time)
         # simulate problem
-        self.problem.simulate(self.current_time, self.update_time, self.sample_time)
+        with timed('simulate', 'simulator'):
+            self.problem.simulate(self.current_time, self.update_time, self.sample_time)
         # check stop condition
-        stop = self.problem.stop_criterium(self.current_time, self.update_time)
+        with timed('stop_criterium', 'simulator'):
+            stop = self.problem.stop_criterium(self.current_time, self.update_time)
         return stop
 
     def reset_timing(self):
@@ -20,6 +20,7 @@
 from __future__ import print_function
 import os
 import shutil
+import numpy as np
 
 
 def search_casadi():
@@ -34,6 +35,13 @@ def search_casadi():
     return libdir, incdir
 
 
+def dense_transform(T):
+    # the spline transformations are (cached) sparse matrices
+    if hasattr(T, 'toarray'):
+        return T.toarray()
+    return np.array(T)
+
+
 class Export(object):
 
     def __init__(self, problem, options):
@@ -250,10 +258,11 @@ class Export(object):
             for name, spl in child._splines_prim.items():
                 if name in child._variables:
                     if spl['init'] is not None:
+                        init = dense_transform(spl['init'])
                         tf = '{'
-                        for k in range(spl['init'].shape[0]):
+                        for k in range(init.shape[0]):
                             tf += '{'+','.join([str(t)
-                                                for t in spl['init'][k].tolist()])+'},'
+                                                for t in init[k].tolist()])+'},'
                         tf = tf[:-1]+'}'
                         constants.update({('std::vector<std::vector<double>> %s_TF') % name.upper(): tf})
         return constants
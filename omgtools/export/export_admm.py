@@ -20,7 +20,7 @@
 import os
 import shutil
 from casadi import nlpsol
-from .export import Export
+from .export import Export, dense_transform
 
 
 class ExportADMM(Export):
@@ -111,9 +111,10 @@ class ExportADMM(Export):
                         if set(range(sl_min, sl_max)) <= set(ind):
                             spl = child._splines_prim[name]
                             if spl['init'] is not None:
+                                init = dense_transform(spl['init'])
                                 tf = '{'
-                                for k in range(spl['init'].shape[0]):
-                                    tf += '{'+','.join([str(t) for t in spl['init'][k].tolist()])+'},'
+                                for k in range(init.shape[0]):
+                                    tf += '{'+','.join([str(t) for t in init[k].tolist()])+'},'
                                 tf = tf[:-1]+'}'
                                 constants.update({('std::vector<std::vector<double>> XVAR_%s_TF') % name.upper(): tf})
                             break
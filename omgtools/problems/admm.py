@@ -19,6 +19,7 @@
 
 from ..basics.optilayer import OptiFather, create_function
 from ..basics.spline_extra import shift_knot1_fwd, shift_knot1_bwd, shift_over_knot
+from ..basics.instrumentation import record, record_solver_stats
 from .problem import Problem
 from .dualmethod import DualUpdater, DualProblem
 from casadi import symvar, mtimes, MX, Function
@@ -393,6 +394,9 @@ class ADMM(DualUpdater):
         self.father_updx.set_variables(result['x'])
         self.var_admm['x_i'] = self._get_x_variables()
         stats = self.problem_upd_x.stats()
+        record('update_x', t_upd, 'updater%d' % self._index)
+        record_solver_stats(stats, 'updater%d' % self._index, 'update_x')
+        self.record_iterations(stats)
         if (stats['return_status'] != 'Solve_Succeeded'):
             print('upd_x %d: %s' % (self._index, stats['return_status']))
         return t_upd
@@ -442,6 +446,7 @@ class ADMM(DualUpdater):
         self.var_admm['z_i'] = self.q_i_struct(z_i)
         self.var_admm['z_ij'] = self.q_ij_struct(z_ij)
         t1 = time.time()
+        record('update_z', t1-t0, 'updater%d' % self._index)
         return t1-t0
 
     def update_l(self, current_time):
@@ -463,6 +468,7 @@ class ADMM(DualUpdater):
         self.var_admm['l_i'] = self.q_i_struct(out[0])
         self.var_admm['l_ij'] = self.q_ij_struct(out[1])
         t1 = time.time()
+        record('update_l', t1-t0, 'updater%d' % self._index)
         return t1-t0
 
     def communicate(self):
@@ -505,6 +511,7 @@ class ADMM(DualUpdater):
         out = self.problem_upd_res(x_i, z_i, z_i_p, z_ij, z_ij_p, x_j, t, T, rho)
         pr, dr, cr = [float(o) for o in out]
         t1 = time.time()
+        record('residuals', t1-t0, 'updater%d' % self._index)
         return t1-t0, pr, dr, cr
 
     def accelerate(self, c_res):
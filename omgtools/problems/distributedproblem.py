@@ -18,6 +18,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from .problem import Problem
+from ..basics.build_scheduler import build_scope
 from casadi import symvar, Function
 import collections as col
 import numpy as np
@@ -69,21 +70,24 @@ class DistributedProblem(Problem):
             self.updaters.append(updater)
         self.interprete_constraints(self.updaters)
         buildtime = []
-        if self.options['separate_build']:
-            for updater in self.updaters:
-                _, bt = updater.init()
-                buildtime.append(bt)
-        else:
-            updaters = self.separate_per_build()
-            for veh_type, nghb_nr in updaters.items():
-                for nr, upd in nghb_nr.items():
-                    if self.options['verbose'] >= 2:
-                        print('*Construct problem for type %s with %d neighbor(s):' % (veh_type, nr))
-                    problems, bt = upd[0].init()
+        # the shared objects of all updaters are compiled concurrently
+        with build_scope(self.options['codegen'].get('n_jobs'),
+                         self.options['verbose']) as scheduler:
+            if self.options['separate_build']:
+                for updater in self.updaters:
+                    _, bt = updater.init()
                     buildtime.append(bt)
-                    for u in upd[1:]:
-                        u.init(problems)
-        return np.mean(buildtime)
+            else:
+                updaters = self.separate_per_build()
+                for veh_type, nghb_nr in updaters.items():
+                    for nr, upd in nghb_nr.items():
+                        if self.options['verbose'] >= 2:
+                            print('*Construct problem for type %s with %d neighbor(s):' % (veh_type, nr))
+                        problems, bt = upd[0].init()
+                        buildtime.append(bt)
+                        for u in upd[1:]:
+                            u.init(problems)
+        return np.mean(buildtime) + scheduler.walltime/len(buildtime)
 
     def separate_per_build(self):
         vehicle_types = self.fleet.sort_vehicles()
@@ -172,7 +176,7 @@ class DistributedProblem(Problem):
         children = [veh for veh in self.vehicles]
         children.extend(self.problems)
         children.append(self.environment)
-        children.extend(self.environment.obstacles)
+        children.extend(self.environment.get_obstacle_children())
         symbol_dict = col.OrderedDict()
         for child in children:
             symbol_dict.update(child.symbol_dict)
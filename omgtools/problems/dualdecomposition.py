@@ -19,6 +19,7 @@
 
 from ..basics.optilayer import OptiFather, create_function
 from ..basics.spline_extra import shift_knot1_fwd, shift_over_knot
+from ..basics.instrumentation import record, record_solver_stats
 from .problem import Problem
 from .dualmethod import DualUpdater, DualProblem
 from casadi import symvar, mtimes, MX, reshape, substitute
@@ -202,6 +203,9 @@ class DDUpdater(DualUpdater):
         z_ij = self.father_updx.get_variables(self, 'z_ij', spline=False)
         self.var_dd['z_ij'] = self.q_ij_struct(z_ij)
         stats = self.problem_upd_xz.stats()
+        record('update_xz', t_upd, 'updater%d' % self._index)
+        record_solver_stats(stats, 'updater%d' % self._index, 'update_xz')
+        self.record_iterations(stats)
         if (stats['return_status'] != 'Solve_Succeeded'):
             print('upd_xz %d: %s' % (self._index, stats['return_status']))
         return t_upd
@@ -220,6 +224,7 @@ class DDUpdater(DualUpdater):
         out = self.problem_upd_l(x_j, z_ij, l_ij, t, T, rho)
         self.var_dd['l_ij'] = self.q_ij_struct(out)
         t1 = time.time()
+        record('update_l', t1-t0, 'updater%d' % self._index)
         return t1-t0
 
     def communicate(self):
@@ -255,6 +260,7 @@ class DDUpdater(DualUpdater):
         z_ij = self._transform_spline(self.var_dd['z_ij'], tf, self.q_ij).cat
         pr = la.norm(x_j-z_ij)**2
         t1 = time.time()
+        record('residuals', t1-t0, 'updater%d' % self._index)
         return t1-t0, pr
 
 
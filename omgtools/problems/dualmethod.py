@@ -49,7 +49,7 @@ class DualUpdater(Problem):
         self.vehicle = vehicle
         self.environment = environment
         self.group = col.OrderedDict()
-        for child in ([vehicle, problem, environment, self] + environment.obstacles):
+        for child in ([vehicle, problem, environment, self] + environment.get_obstacle_children()):
             self.group[child.label] = child
         for child in self.group.values():
             child._index = index
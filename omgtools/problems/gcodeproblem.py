@@ -78,7 +78,10 @@ class GCodeProblem(Problem):
             else:
                 self.vehicles[0].define_trajectory_constraints(total_splines[idx], self.motion_times[idx], skip=[])
             # set up room constraints
-            self.vehicles[0].define_collision_constraints(self.environment.room[idx], total_splines[idx], self.motion_times[idx])
+            segment = self.environment.room[idx]
+            if self.environment.parametric_rooms:
+                segment = self.vehicles[0].define_segment_parameters(segment, idx)
+            self.vehicles[0].define_collision_constraints(segment, total_splines[idx], self.motion_times[idx])
 
         # constrain spline segments
         self.define_init_constraints()
@@ -26,6 +26,7 @@ from ..basics.shape import Rectangle, Ring
 from ..basics.geometry import distance_between_points, point_in_polyhedron
 from ..basics.spline import BSplineBasis, BSpline
 from ..basics.spline_extra import concat_splines, running_integral, definite_integral
+from ..basics.instrumentation import timed, count
 
 from casadi import MX, Function, nlpsol, vertcat
 from scipy.interpolate import interp1d
@@ -71,6 +72,12 @@ class GCodeSchedulerProblem(Problem):
         if not isinstance(self.vehicles[0].shapes[0], Circle):
             raise RuntimeError('Vehicle shape can only be a Circle when solving a GCodeSchedulerProblem')
 
+    def set_default_options(self):
+        Problem.set_default_options(self)
+        # the local problems of windows with the same sequence of segment
+        # types (e.g. line-line-arc) share a solver
+        self.options['nlp_templates'] = True
+
     def init(self):
         # otherwise the init of Problem is called, which is not desirable
         pass
@@ -119,7 +126,8 @@ class GCodeSchedulerProblem(Problem):
 
         # did we move far enough over the current segment yet?
         print('Current GCode block: ', self.n_current_block)
-        segments_valid = self.check_segments()
+        with timed('check_segments', self.label):
+            segments_valid = self.check_segments()
         if not segments_valid:
             # add new segment and remove first one
             if hasattr(self, 'no_update') and self.no_update:
@@ -739,11 +747,17 @@ class GCodeSchedulerProblem(Problem):
     def generate_problem(self):
 
         local_rooms = self.environment.room[self.n_current_block:self.n_current_block+self.n_segments]
-        local_environment = Environment(room=local_rooms)
+        # with nlp templates, the geometry of the segments is passed as
+        # parameters, such that only the segment types determine the nlp
+        templates = self.options['nlp_templates']
+        local_environment = Environment(room=local_rooms, parametric_rooms=templates)
         problem = GCodeProblem(self.vehicles[0], local_environment, self.n_segments, motion_time_guess=self.motion_times)
 
-        problem.set_options({'solver_options': self.options['solver_options']})
-        problem.init()
+        problem.set_options({'solver_options': self.options['solver_options'],
+                             'nlp_templates': templates})
+        with timed('generate_problem', self.label):
+            problem.init()
+        count('generated_problems')
         # reset the current_time, to ensure that predict uses the provided
         # last input of previous problem and vehicle velocity is kept from one frame to another
         problem.initialize(current_time=0.)
@@ -193,18 +193,17 @@ class FixedTPoint2point(Point2pointProblem):
         if (interval_prev < interval_now): # passed a knot
             self.father.transform_primal_splines(lambda coeffs, basis, T:
                                                  T.dot(coeffs))
-            # self.father.transform_dual_splines(lambda coeffs, basis, T:
-            #                                    T.dot(coeffs))
+            if self.shift_dual_variables():
+                self.father.transform_dual_splines(lambda coeffs, basis, T:
+                                                   T.dot(coeffs))
         self.current_time_prev = current_time
 
     def init_primal_transform(self, basis):
         return shiftoverknot_T(basis)
 
-    # def init_dual_transform(self, basis):
-    #     B = integral_sqbasis(basis)
-    #     Binv = np.linalg.solve(B, np.eye(len(basis)))
-    #     T = shiftoverknot_T(basis)
-    #     return B.dot(T).dot(Binv)
+    def init_dual_transform(self, basis):
+        # the multipliers of a spline constraint are shifted as its coefficients
+        return shiftoverknot_T(basis)
 
     def initialize(self, current_time):
         Point2pointProblem.initialize(self, current_time)
@@ -365,6 +364,9 @@ class FreeTPoint2point(Point2pointProblem):
             # a new basis with new equidistant knots.
             self.father.transform_primal_splines(
                 lambda coeffs, basis: shift_spline(coeffs, update_time/target_time, basis))
+            if self.shift_dual_variables():
+                self.father.transform_dual_splines(
+                    lambda coeffs, basis: shift_spline(coeffs, update_time/target_time, basis))
             self.father.set_variables(target_time, self, 'T')
 
     def compute_partial_objective(self, current_time):
@@ -18,12 +18,33 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from ..basics.optilayer import OptiFather, OptiChild
+from ..basics.spline import SplineArray
+from ..basics.instrumentation import timed, record, record_solver_stats, count
+from ..basics.telemetry import SolverTelemetry, DEFAULT_CAPACITY
 from ..vehicles.fleet import get_fleet_vehicles
 from ..execution.plotlayer import PlotLayer
 from itertools import groupby
 import numpy as np
 import time
 
+DUAL_WARM_START_OPTIONS = {'ipopt.warm_start_init_point': 'yes',
+                           'ipopt.warm_start_bound_push': 1e-6,
+                           'ipopt.warm_start_bound_frac': 1e-6,
+                           'ipopt.warm_start_slack_bound_push': 1e-6,
+                           'ipopt.warm_start_slack_bound_frac': 1e-6,
+                           'ipopt.warm_start_mult_bound_push': 1e-6,
+                           'ipopt.mu_init': 1e-4}
+
+# sqpmethod options of the real-time iteration (rti) solver
+RTI_SOLVER_OPTIONS = {'print_header': False, 'print_iteration': False,
+                      'print_status': False, 'print_time': 0,
+                      'error_on_fail': False,
+                      'convexify_strategy': 'regularize'}
+QPSOL_OPTIONS = {'qpoases': {'printLevel': 'none', 'sparse': True,
+                             'error_on_fail': False},
+                 'qrqp': {'print_iter': False, 'print_header': False,
+                          'print_info': False, 'error_on_fail': False}}
+
 
 class Problem(OptiChild, PlotLayer):
 
@@ -37,13 +58,19 @@ class Problem(OptiChild, PlotLayer):
         self.set_options(options)
         self.iteration = 0
         self.update_times = []
+        self.iter_counts = []
+        self.solve_modes = []
+        self.rti_residuals = []
+        self.telemetry = None
+        self._rti_reference = None
+        self._culling_updates = 0  # updates since obstacles became unreachable
 
         # first add children and construct father, this allows making a
         # difference between the simulated and the processed vehicles,
         # e.g. when passing on a trailer + leading vehicle to problem, but
         # only the trailer to the simulator
         children = [vehicle for vehicle in self.vehicles]
-        children += [obstacle for obstacle in self.environment.obstacles]
+        children += self.environment.get_obstacle_children()
         children += [self, self.environment]
         self.father = OptiFather(children)
 
@@ -59,7 +86,28 @@ class Problem(OptiChild, PlotLayer):
                          'ipopt.print_level': 0, 'print_time': 0,
                          'ipopt.fixed_variable_treatment':'make_constraint'}
         self.options['solver_options'] = {'ipopt': ipopt_options}
-        self.options['codegen'] = {'build': None, 'flags': '-O0'}
+        self.options['codegen'] = {'build': None, 'flags': '-O0', 'cache': True,
+                                   'n_jobs': None}
+        # also warm start the multipliers of the constraints
+        self.options['dual_warm_start'] = False
+        # real-time iterations: do max_iter sqp iterations per update, and a
+        # full solve at the start and when the kkt residual grows by more
+        # than max_growth with respect to the last full solve (and exceeds tol)
+        self.options['rti'] = {'enabled': False, 'max_iter': 1,
+                               'qpsol': 'qpoases', 'max_growth': 2.,
+                               'tol': 1e-3}
+        # keep the ipopt iterations of the last solves (True or the number of
+        # iterations to keep), see SolverTelemetry
+        self.options['telemetry'] = False
+        # reuse the solver of a previously built problem with the same nlp
+        self.options['nlp_templates'] = False
+        # only avoid the obstacles that the vehicles can reach within
+        # horizon_time (default: the horizon_time option), the problem is
+        # rebuilt when an obstacle becomes reachable and interval updates
+        # after obstacles became unreachable
+        self.options['obstacle_culling'] = {'enabled': False,
+                                            'horizon_time': None,
+                                            'interval': 10}
 
     def set_options(self, options):
         if 'solver_options' in options:
@@ -69,8 +117,13 @@ class Problem(OptiChild, PlotLayer):
                 self.options['solver_options'][key].update(value)
         if 'codegen' in options:
             self.options['codegen'].update(options['codegen'])
+        if 'rti' in options:
+            self.options['rti'].update(options['rti'])
+        if 'obstacle_culling' in options:
+            self.options['obstacle_culling'].update(options['obstacle_culling'])
         for key in options:
-            if key not in ['solver_options', 'codegen']:
+            if key not in ['solver_options', 'codegen', 'rti',
+                           'obstacle_culling']:
                 self.options[key] = options[key]
 
     # ========================================================================
@@ -78,6 +131,7 @@ class Problem(OptiChild, PlotLayer):
     # ========================================================================
 
     def construct(self):
+        self.environment.reach_time = self.get_reach_time()
         self.environment.init()
         for vehicle in self.vehicles:
             vehicle.init()
@@ -85,39 +139,146 @@ class Problem(OptiChild, PlotLayer):
     def init(self):
         self.father.reset()
         self.construct()
+        if self.options['dual_warm_start'] and self.options['solver'] == 'ipopt':
+            # keep ipopt close to the given primal-dual point
+            ipopt_options = self.options['solver_options']['ipopt']
+            for key, value in DUAL_WARM_START_OPTIONS.items():
+                if key not in ipopt_options:
+                    ipopt_options[key] = value
         self.problem, buildtime = self.father.construct_problem(self.options)
+        if self.options['rti']['enabled']:
+            buildtime += self.construct_rti()
         self.father.init_transformations(self.init_primal_transform,
                                          self.init_dual_transform)
         return buildtime
 
+    def get_reach_time(self):
+        culling = self.options['obstacle_culling']
+        if not culling['enabled']:
+            return None
+        reach_time = culling['horizon_time'] or self.options.get('horizon_time')
+        if reach_time is None:
+            raise ValueError('Please provide a horizon_time for the obstacle culling.')
+        return reach_time
+
+    def shift_dual_variables(self):
+        # the multipliers are shifted over the horizon if they are used to
+        # warm start the next update
+        return (self.options['dual_warm_start'] or
+                self.options['rti']['enabled'])
+
+    def construct_rti(self):
+        rti = self.options['rti']
+        sqp_options = dict(RTI_SOLVER_OPTIONS)
+        sqp_options.update({'max_iter': rti['max_iter'],
+                            'qpsol': rti['qpsol'],
+                            'qpsol_options': QPSOL_OPTIONS.get(rti['qpsol'],
+                                                               {})})
+        sqp_options.update(self.options['solver_options'].get('sqpmethod', {}))
+        options = dict(self.options)
+        options.update({'solver': 'sqpmethod',
+                        'solver_options': {'sqpmethod': sqp_options}})
+        self.rti_problem, self._kkt, buildtime = self.father.construct_rti(
+            options)
+        self._rti_reference = None
+        return buildtime
+
     # ========================================================================
     # Deploying related functions
     # ========================================================================
 
+    def update_culling(self):
+        # rebuild the problem if the set of reachable obstacles changed
+        culling = self.options['obstacle_culling']
+        if not culling['enabled']:
+            return
+        grown, shrunk = False, False
+        for vehicle in self.vehicles:
+            if vehicle not in self.environment.avoided:
+                continue
+            reachable = self.environment.get_reachable_obstacles(vehicle)
+            avoided = self.environment.avoided[vehicle]
+            grown |= any(o not in avoided for o in reachable)
+            shrunk |= len(reachable) < len(avoided)
+        self._culling_updates = self._culling_updates + 1 if shrunk else 0
+        if grown or self._culling_updates >= culling['interval']:
+            self._culling_updates = 0
+            if self.options['verbose'] >= 2:
+                print('Reachable obstacles changed, rebuilding problem')
+            with timed('rebuild', self.label):
+                self.rebuild()
+            count('culling_rebuilds')
+
+    def rebuild(self):
+        # rebuild the problem, keeping the values of the remaining variables
+        values = []
+        for child in self.father.children.values():
+            for name in child._variables:
+                values.append((child, name, np.array(
+                    self.father.get_variables(child, name, spline=False))))
+        self.init()
+        for child, name, value in values:
+            if (name in child._variables and
+                    child._variables[name].shape == value.shape):
+                self.father.set_variables(value, child, name)
+        self._rti_reference = None
+
     def reinitialize(self, father=None):
         if father is None:
             father = self.father
         father.init_variables()
         father.init_parameters()
+        self._rti_reference = None
 
     def solve(self, current_time, update_time):
         current_time -= self.start_time  # start_time: the point in time where you start solving
-        self.init_step(current_time, update_time)  # pass on update_time to make initial guess
+        self.update_culling()
+        with timed('init_step', self.label):
+            self.init_step(current_time, update_time)  # pass on update_time to make initial guess
         # set initial guess, parameters, lb & ub
         var = self.father.get_variables()
         dual_var = self.father.get_dual_variables()
-        par = self.father.set_parameters(current_time)
-        lb, ub = self.father.update_bounds(current_time)
+        with timed('set_parameters', self.label):
+            par = self.father.set_parameters(current_time)
+        with timed('update_bounds', self.label):
+            lb, ub = self.father.update_bounds(current_time)
         # solve!
         t0 = time.time()
-        result = self.problem(x0=var, p=par, lbg=lb, ubg=ub)
-        # result = self.problem(x0=var, lam_g0= dual_var, p=par, lbg=lb, ubg=ub)
+        if self.options['rti']['enabled'] and self._rti_reference is not None:
+            result = self.solve_rti(var, dual_var, par, lb, ub)
+        else:
+            result = None
+        if result is None:
+            result = self.solve_full(var, dual_var, par, lb, ub, current_time)
         t1 = time.time()
         t_upd = t1-t0
+        record('solve', t_upd, self.label)
         self.father.set_variables(result['x'])
         self.father.set_dual_variables(result['lam_g'])
+        self.father.set_bound_multipliers(result['lam_x'])
+        if self.options['verbose'] >= 2:
+            self.iteration += 1
+            if ((self.iteration-1) % 20 == 0):
+                print("----|------------|------------")
+                print("%3s | %10s | %10s " % ("It", "t upd", "time"))
+                print("----|------------|------------")
+            print("%3d | %.4e | %.4e " % (self.iteration, t_upd, current_time))
+        self.update_times.append(t_upd)
+
+    def solve_full(self, var, dual_var, par, lb, ub, current_time):
+        if self.options['dual_warm_start']:
+            result = self.problem(x0=var, lam_x0=self.father.get_bound_multipliers(),
+                                  lam_g0=dual_var, p=par, lbg=lb, ubg=ub)
+        else:
+            result = self.problem(x0=var, p=par, lbg=lb, ubg=ub)
         stats = self.problem.stats()
+        record_solver_stats(stats, self.label, 'solve_full')
+        self.record_iterations(stats)
+        self.iter_counts.append(stats.get('iter_count'))
+        self.solve_modes.append(
+            'full' if self._rti_reference is None else 'fallback')
         if stats['return_status'] != 'Solve_Succeeded':
+            self._rti_reference = None
             if stats['return_status'] == 'Maximum_CpuTime_Exceeded':
                 if current_time != 0.0:  # first iteration can be slow, neglect time here
                     print('Maximum solving time exceeded, resetting initial guess')
@@ -126,14 +287,56 @@ class Problem(OptiChild, PlotLayer):
             else:
                 # there was another problem
                 print(stats['return_status'])
-        if self.options['verbose'] >= 2:
-            self.iteration += 1
-            if ((self.iteration-1) % 20 == 0):
-                print("----|------------|------------")
-                print("%3s | %10s | %10s " % ("It", "t upd", "time"))
-                print("----|------------|------------")
-            print("%3d | %.4e | %.4e " % (self.iteration, t_upd, current_time))
-        self.update_times.append(t_upd)
+        elif self.options['rti']['enabled']:
+            residual = self.kkt_residual(result['x'], result['lam_g'], par,
+                                         lb, ub)
+            self._rti_reference = max(residual, self.options['rti']['tol'])
+        return result
+
+    def solve_rti(self, var, dual_var, par, lb, ub):
+        # a few sqp iterations from the shifted previous solution, returns
+        # None if these do not converge
+        rti = self.options['rti']
+        result = self.rti_problem(x0=var, lam_g0=dual_var, p=par,
+                                  lbg=lb, ubg=ub)
+        stats = self.rti_problem.stats()
+        record_solver_stats(stats, self.label, 'solve_rti')
+        self.record_iterations(stats)
+        if stats['return_status'] not in ['Solve_Succeeded',
+                                          'Maximum_Iterations_Exceeded']:
+            residual = np.inf
+        else:
+            residual = self.kkt_residual(result['x'], result['lam_g'], par,
+                                         lb, ub)
+        self.rti_residuals.append(residual)
+        if residual > max(rti['max_growth']*self._rti_reference, rti['tol']):
+            if self.options['verbose'] >= 2:
+                print('Residual of real-time iteration grows (%.2e), '
+                      'falling back to full solve' % residual)
+            return None
+        self.iter_counts.append(stats.get('iter_count'))
+        self.solve_modes.append('rti')
+        # the reference stays the residual of the last full solve, such that
+        # a slow drift is caught as well
+        return result
+
+    def record_iterations(self, stats):
+        if not self.options['telemetry']:
+            return
+        if self.telemetry is None:
+            capacity = self.options['telemetry']
+            self.telemetry = SolverTelemetry(
+                DEFAULT_CAPACITY if capacity is True else capacity)
+        self.telemetry.record(stats)
+
+    def kkt_residual(self, var, dual_var, par, lb, ub):
+        # max of the constraint violation and the gradient of the lagrangian
+        con, grad = self._kkt(var, par, dual_var)
+        con = np.array(con).ravel()
+        residual = max(np.max(lb - con, initial=0.),
+                       np.max(con - ub, initial=0.),
+                       np.max(np.abs(np.array(grad)), initial=0.))
+        return residual if np.isfinite(residual) else np.inf
 
     def predict(self, current_time, predict_time, sample_time, states=None, inputs=None, dinputs=None, delay=0, enforce_states=False, enforce_inputs=False):
         if states is None:
@@ -199,9 +402,10 @@ class Problem(OptiChild, PlotLayer):
             spline_values = vehicle.signals['splines'][:, -1]
             spline_values = [self.father.get_variables(
                 vehicle, 'splines_seg'+str(k), spline=False)[-1, :] for k in range(vehicle.n_seg)]
-            for segment, values in zip(spline_segments, spline_values):
-                for spl, value in zip(segment, values):
-                    spl.coeffs = value*np.ones(len(spl.basis))
+            # the results of get_variables are read-only: stay at the end point
+            spline_segments = [SplineArray(segment.basis, np.tile(
+                values, (len(segment.basis), 1)))
+                for segment, values in zip(spline_segments, spline_values)]
             vehicle.store(current_time, sample_time, spline_segments, sleep_time)
         # no correction for update time!
         Problem.simulate(self, current_time, sleep_time, sample_time)
@@ -28,6 +28,7 @@ from ..environment.frame import ShiftFrame, CorridorFrame
 from ..basics.shape import Rectangle, Circle
 from ..basics.spline import BSplineBasis
 from ..basics.spline_extra import concat_splines
+from ..basics.instrumentation import timed, count
 
 from scipy.interpolate import interp1d
 import scipy.linalg as la
@@ -99,6 +100,11 @@ class SchedulerProblem(Problem):
                           ' when switching frames. Consider reducing the amount of cells or reducing' +
                           ' the size of the vehicle')
 
+    def set_default_options(self):
+        Problem.set_default_options(self)
+        # the local problems of structurally identical frames share a solver
+        self.options['nlp_templates'] = True
+
     def init(self):
         # otherwise the init of Problem is called, which is not desirable
         pass
@@ -147,7 +153,8 @@ class SchedulerProblem(Problem):
             # all other iterations
             self.curr_state = self.vehicles[0].signals['state'][:,-1]
 
-        frames_valid = self.check_frames()
+        with timed('check_frames', self.label):
+            frames_valid = self.check_frames()
         if not frames_valid:
             self.cnt += 1  # count frame
 
@@ -707,7 +714,10 @@ class SchedulerProblem(Problem):
             new_room['position'] = self.frames[k].border['position']
             new_room['draw'] = True
             room.append(new_room)
-        environment = Environment(room=room)
+        # with nlp templates, the frame geometry is passed as parameters, such
+        # that structurally identical frames reuse the same solver
+        templates = self.options['nlp_templates']
+        environment = Environment(room=room, parametric_rooms=templates)
 
         for k in range(self.n_frames):
             obstacles = self.frames[k].stationary_obstacles+self.frames[k].moving_obstacles
@@ -722,8 +732,11 @@ class SchedulerProblem(Problem):
             problem = Point2point(self.vehicles, environment, freeT=self.problem_options['freeT'], options=problem_options)
         else:
             problem = MultiFrameProblem(self.vehicles, environment, n_frames=self.n_frames)
-        problem.set_options({'solver_options': self.options['solver_options']})
-        problem.init()
+        problem.set_options({'solver_options': self.options['solver_options'],
+                             'nlp_templates': templates})
+        with timed('generate_problem', self.label):
+            problem.init()
+        count('generated_problems')
         # reset the current_time, to ensure that predict uses the provided
         # last input of previous problem and vehicle velocity is kept from one frame to another
         problem.initialize(current_time=0.)
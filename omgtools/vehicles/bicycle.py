@@ -20,7 +20,8 @@
 from .vehicle import Vehicle
 from ..problems.point2point import FreeTPoint2point, FixedTPoint2point
 from ..basics.shape import Rectangle, Circle
-from ..basics.spline_extra import sample_splines, evalspline, concat_splines
+from ..basics.spline_extra import sample_splines, sample_derivatives
+from ..basics.spline_extra import evalspline, concat_splines
 from ..basics.spline_extra import running_integral
 from ..basics.spline import BSplineBasis
 from casadi import inf, SX, MX
@@ -290,8 +291,6 @@ class Bicycle(Vehicle):
         # note: here the splines are not dimensionless anymore
         signals = {}
         v_til, tg_ha = splines[0], splines[1]
-        dv_til, dtg_ha = v_til.derivative(), tg_ha.derivative()
-        ddtg_ha = tg_ha.derivative(2)
         dx = v_til*(1-tg_ha**2)
         dy = v_til*(2*tg_ha)
         if not hasattr(self, 'signals'):  # first iteration
@@ -307,11 +306,10 @@ class Bicycle(Vehicle):
             # x = dx_int - dx_int(time[0]) + self.signals['state'][0, -1]
             # y = dy_int - dy_int(time[0]) + self.signals['state'][1, -1]
         # sample splines
-        tg_ha = np.array(sample_splines([tg_ha], time))
-        v_til = np.array(sample_splines([v_til], time))
-        dtg_ha = np.array(sample_splines([dtg_ha], time))
-        dv_til = np.array(sample_splines([dv_til], time))
-        ddtg_ha = np.array(sample_splines([ddtg_ha], time))
+        samples = sample_derivatives([v_til, tg_ha], time, 2)
+        v_til, tg_ha = np.array(samples[0][:1]), np.array(samples[0][1:])
+        dv_til, dtg_ha = np.array(samples[1][:1]), np.array(samples[1][1:])
+        ddtg_ha = np.array(samples[2][1:])
         theta = 2*np.arctan2(tg_ha, 1)
         delta = np.arctan2(2*dtg_ha*self.length, v_til*(1+tg_ha**2)**2)
         ddelta = (2*ddtg_ha*self.length*(v_til*(1+tg_ha**2)**2)-2*dtg_ha*self.length*(dv_til*(1+tg_ha**2)**2 + v_til*(4*tg_ha+4*tg_ha**3)*dtg_ha))/(v_til**2*(1+tg_ha**2)**4+(2*dtg_ha*self.length)**2)
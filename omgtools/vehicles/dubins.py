@@ -20,7 +20,7 @@
 from .vehicle import Vehicle
 from ..problems.point2point import FreeTPoint2point, FixedTPoint2point
 from ..basics.shape import Square, Circle
-from ..basics.spline_extra import sample_splines
+from ..basics.spline_extra import sample_splines, sample_derivatives
 from ..basics.spline_extra import evalspline, running_integral, concat_splines
 from ..basics.spline import BSplineBasis
 from casadi import inf, SX, MX
@@ -272,7 +272,6 @@ class Dubins(Vehicle):
         # note: here the splines are not dimensionless anymore
         signals = {}
         v_til, tg_ha = splines[0], splines[1]
-        dtg_ha = tg_ha.derivative()
         dx = v_til*(1-tg_ha**2)
         dy = v_til*(2*tg_ha)
         if not hasattr(self, 'signals'):  # first iteration
@@ -281,7 +280,8 @@ class Dubins(Vehicle):
         else:
             x = self.integrate_once(dx, self.signals['state'][0, -1], time[0])
             y = self.integrate_once(dy, self.signals['state'][1, -1], time[0])
-        x_s, y_s, v_til_s, tg_ha_s, dtg_ha_s = sample_splines([x, y, v_til, tg_ha, dtg_ha], time)
+        x_s, y_s = sample_splines([x, y], time)
+        (v_til_s, tg_ha_s), (_, dtg_ha_s) = sample_derivatives([v_til, tg_ha], time, 1)
         den = sample_splines([(1+tg_ha**2)], time)[0]
         theta = 2*np.arctan2(tg_ha_s,1)
         dtheta = 2*np.array(dtg_ha_s)/(1.+np.array(tg_ha_s)**2)
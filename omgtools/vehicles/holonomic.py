@@ -19,7 +19,7 @@
 
 from .vehicle import Vehicle
 from ..basics.shape import Circle
-from ..basics.spline_extra import sample_splines
+from ..basics.spline_extra import sample_derivatives
 from casadi import inf
 import numpy as np
 
@@ -165,13 +165,12 @@ class Holonomic(Vehicle):
     def splines2signals(self, splines, time):
         signals = {}
         x, y = splines[0], splines[1]
-        dx, dy = x.derivative(), y.derivative()
-        ddx, ddy = x.derivative(2), y.derivative(2)
-        input = np.c_[sample_splines([dx, dy], time)]
-        signals['state'] = np.c_[sample_splines([x, y], time)]
+        pos, vel, acc = sample_derivatives([x, y], time, 2)
+        input = np.c_[vel]
+        signals['state'] = np.c_[pos]
         signals['input'] = input
         signals['v_tot'] = np.sqrt(input[0, :]**2 + input[1, :]**2)
-        signals['dinput'] = np.c_[sample_splines([ddx, ddy], time)]
+        signals['dinput'] = np.c_[acc]
         return signals
 
     def state2pose(self, state):
@@ -18,7 +18,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from .vehicle import Vehicle
-from ..basics.spline_extra import sample_splines
+from ..basics.spline_extra import sample_derivatives
 from casadi import inf
 import numpy as np
 
@@ -135,14 +135,13 @@ class Holonomic3D(Vehicle):
     def splines2signals(self, splines, time):
         signals = {}
         x, y, z = splines[0], splines[1], splines[2]
-        dx, dy, dz = x.derivative(), y.derivative(), z.derivative()
-        ddx, ddy, ddz = x.derivative(2), y.derivative(2), z.derivative(2)
-        input = np.c_[sample_splines([dx, dy, dz], time)]
-        signals['state'] = np.c_[sample_splines([x, y, z], time)]
+        pos, vel, acc = sample_derivatives([x, y, z], time, 2)
+        input = np.c_[vel]
+        signals['state'] = np.c_[pos]
         signals['input'] = input
         signals['v_tot'] = np.sqrt(
             input[0, :]**2 + input[1, :]**2 + input[2, :]**2)
-        signals['a'] = np.c_[sample_splines([ddx, ddy, ddz], time)]
+        signals['a'] = np.c_[acc]
         return signals
 
     def state2pose(self, state):
@@ -19,7 +19,7 @@
 
 from .vehicle import Vehicle
 from ..basics.shape import Circle
-from ..basics.spline_extra import sample_splines
+from ..basics.spline_extra import sample_derivatives
 from casadi import inf
 import numpy as np
 
@@ -124,14 +124,8 @@ class Quadrotor(Vehicle):
     def splines2signals(self, splines, time):
         signals = {}
         x, y = splines[0], splines[1]
-        dx, dy = x.derivative(), y.derivative()
-        ddx, ddy = x.derivative(2), y.derivative(2)
-        dddx, dddy = x.derivative(3), y.derivative(3)
-
-        x_s, y_s = sample_splines([x, y], time)
-        dx_s, dy_s = sample_splines([dx, dy], time)
-        ddx_s, ddy_s = sample_splines([ddx, ddy], time)
-        dddx_s, dddy_s = sample_splines([dddx, dddy], time)
+        ((x_s, y_s), (dx_s, dy_s), (ddx_s, ddy_s),
+            (dddx_s, dddy_s)) = sample_derivatives([x, y], time, 3)
 
         theta = np.arctan2(ddx_s, ddy_s + self.g)
         u1 = np.sqrt(ddx_s**2 + (ddy_s + self.g)**2)
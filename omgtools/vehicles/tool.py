@@ -176,36 +176,33 @@ class Tool(Vehicle):
         parameters[self]['poseT'] = self.poseT
         return parameters
 
-    def define_collision_constraints(self, segment, splines, horizon_time):
-        # set up the constraints that ensure that spline stays inside segment shape
-        x, y, z = splines
-        position = [x, y]  # collision avoidance in xy-plane (2D)
-
-        # check room shape and orientation,
-        # check vehicle shape and orientation
-        # these determine the formulation of the collision avoidance constraints
+    def get_segment_type(self, segment):
+        # the type of the segment determines the formulation of the collision
+        # avoidance constraints: 'line' (horizontal or vertical), 'diagonal' or 'arc'
         shape = self.shapes[0]  # tool shape
-        checkpoints, rad = shape.get_checkpoints()  # tool checkpoints, rad = shape_size
-        # used 2*rad[0] below to get a larger margin and avoid numerical errors when checking if tool is inside shape
         if (isinstance(segment['shape'], (Rectangle, Square)) and
             ((segment['shape'].orientation) % (np.pi/2) == 0) and
             (isinstance(shape, Circle) or
             (isinstance(shape, (Rectangle, Square)) and
              shape.orientation == 0))):
-            # we have a horizontal or vertical straight line segment and
-            # a Circular or rectangular tool
-
-            lims = segment['shape'].get_canvas_limits()
-            room_limits = []
-            room_limits += [lims[k]+segment['pose'][k] for k in range(self.n_dim)]
-            for chck in checkpoints:
-                for k in range(2):
-                    self.define_constraint(-(chck[k]+position[k]) + room_limits[k][0] + rad[0], -inf, 0.)
-                    self.define_constraint((chck[k]+position[k]) - room_limits[k][1] + rad[0], -inf, 0.)
+            return 'line'
         elif (isinstance(segment['shape'], (Rectangle, Square)) and
             (isinstance(shape, Circle))):
-            # we have a diagonal line segment
+            return 'diagonal'
+        elif (isinstance(segment['shape'], (Ring)) and
+            (isinstance(shape, Circle))):
+            return 'arc'
+        else:
+            raise RuntimeError('Invalid segment obtained when setting up collision avoidance constraints')
 
+    def get_segment_geometry(self, segment):
+        # numerical description of the segment, as used in the collision avoidance constraints
+        geometry = {}
+        segment_type = self.get_segment_type(segment)
+        if segment_type == 'line':
+            lims = segment['shape'].get_canvas_limits()
+            geometry['limits'] = np.array([lims[k]+segment['pose'][k] for k in range(self.n_dim)])
+        elif segment_type == 'diagonal':
             # in that case for any point [x, y] on the (infinite) line, the following equation must hold:
 
             # -tol <= a'*q - b <= tol
@@ -213,35 +210,84 @@ class Tool(Vehicle):
 
             x1, y1, z1 = segment['start']
             x2, y2, z2 = segment['end']
-            tolerance = segment['shape'].height*0.5
-
             vector = [x2-x1, y2-y1]  # vector from end to start
             a = np.array([-vector[1],vector[0]])*(1/np.sqrt(vector[0]**2+vector[1]**2))  # normalized normal vector
-            b = np.dot(a,np.array([x1, y1]))  # offset
+            geometry['a'] = a
+            geometry['b'] = np.dot(a,np.array([x1, y1]))  # offset
+            geometry['tolerance'] = segment['shape'].height*0.5
+        elif segment_type == 'arc':
+            geometry['center'] = np.array(segment['pose'][:2])
+            geometry['radii'] = np.array([segment['shape'].radius_in, segment['shape'].radius_out])
+        if segment['start'][2] != segment['end'][2]:
+            # movement in z-direction
+            geometry['z_limits'] = np.array([min(segment['start'][2],segment['end'][2]),
+                                             max(segment['start'][2],segment['end'][2])])
+        if self.options['variable_tolerance']:
+            geometry['end'] = np.array(segment['end'][:2])
+        return geometry
+
+    def define_segment_parameters(self, segment, idx):
+        # Return a copy of segment idx of which the geometry is given by
+        # parameters. The collision avoidance constraints then only depend on
+        # the type of the segment, such that windows with the same sequence of
+        # segment types result in the same nlp.
+        segment = dict(segment)
+        geometry = {}
+        for key, value in self.get_segment_geometry(segment).items():
+            value = np.array(value, dtype=float)
+            shape = value.shape + (1,)*(2-value.ndim)
+            geometry[key] = self.define_parameter(
+                'segment_'+key+str(idx), shape[0], shape[1], value=value)
+        segment['geometry'] = geometry
+        return segment
+
+    def define_collision_constraints(self, segment, splines, horizon_time):
+        # set up the constraints that ensure that spline stays inside segment shape
+        x, y, z = splines
+        position = [x, y]  # collision avoidance in xy-plane (2D)
 
+        # check room shape and orientation,
+        # check vehicle shape and orientation
+        # these determine the formulation of the collision avoidance constraints
+        shape = self.shapes[0]  # tool shape
+        checkpoints, rad = shape.get_checkpoints()  # tool checkpoints, rad = shape_size
+        segment_type = self.get_segment_type(segment)
+        if 'geometry' in segment:
+            # parametric segment, see define_segment_parameters
+            geometry = segment['geometry']
+        else:
+            geometry = self.get_segment_geometry(segment)
+        # used 2*rad[0] below to get a larger margin and avoid numerical errors when checking if tool is inside shape
+        if segment_type == 'line':
+            # we have a horizontal or vertical straight line segment and
+            # a Circular or rectangular tool
+            room_limits = geometry['limits']
+            for chck in checkpoints:
+                for k in range(2):
+                    self.define_constraint(-(chck[k]+position[k]) + room_limits[k, 0] + rad[0], -inf, 0.)
+                    self.define_constraint((chck[k]+position[k]) - room_limits[k, 1] + rad[0], -inf, 0.)
+        elif segment_type == 'diagonal':
+            # we have a diagonal line segment
+            a, b, tolerance = geometry['a'], geometry['b'], geometry['tolerance']
             self.define_constraint(a[0]*position[0] + a[1]*position[1] - b - tolerance + rad[0], -inf, 0.)
             self.define_constraint(-a[0]*position[0] - a[1]*position[1] + b - tolerance + rad[0], -inf, 0.)
 
-        elif (isinstance(segment['shape'], (Ring)) and
-            (isinstance(shape, Circle))):
+        elif segment_type == 'arc':
             # we have a Ring/Circle segment
             # we impose that the trajectory/splines must lie within the outside and inside circle
 
             # Todo: constraint imposes that the trajectory must lie inside the complete ring, not that it
             # may only lie inside the ring segment. Improve?
 
-            center = segment['pose']
+            center, radii = geometry['center'], geometry['radii']
             self.define_constraint(-(position[0] - center[0])**2 - (position[1] - center[1])**2 +
-                                  (segment['shape'].radius_in + rad[0])**2, -inf, 0.)
+                                  (radii[0] + rad[0])**2, -inf, 0.)
             self.define_constraint((position[0] - center[0])**2 + (position[1] - center[1])**2 -
-                                  (segment['shape'].radius_out - rad[0])**2, -inf, 0.)
-        else:
-            raise RuntimeError('Invalid segment obtained when setting up collision avoidance constraints')
+                                  (radii[1] - rad[0])**2, -inf, 0.)
 
         # collision avoidance in z-direction: stay within connection from start to end, with a little margin
-        if segment['start'][2] != segment['end'][2]:
-            z_min = min(segment['start'][2],segment['end'][2])
-            z_max = max(segment['start'][2],segment['end'][2])
+        if 'z_limits' in geometry:
+            z_min, z_max = geometry['z_limits'][0], geometry['z_limits'][1]
             # movement in z-direction
             self.define_constraint(-z + z_min - rad[0], -inf, 0.)
             self.define_constraint(z - z_max  - rad[0], -inf, 0.)
@@ -262,10 +308,11 @@ class Tool(Vehicle):
         # when using variable tolerances, explaining the if-check below.
 
         if self.options['variable_tolerance']:
-            self.define_constraint(position[0](1.) - segment['end'][0] - self.tolerance*0.9, -inf, 0.)
-            self.define_constraint(-position[0](1.) + segment['end'][0] - self.tolerance*0.9, -inf, 0.)
-            self.define_constraint(position[1](1.) - segment['end'][1] - self.tolerance*0.9, -inf, 0.)
-            self.define_constraint(-position[1](1.) + segment['end'][1] - self.tolerance*0.9, -inf, 0.)
+            end = geometry['end']
+            self.define_constraint(position[0](1.) - end[0] - self.tolerance*0.9, -inf, 0.)
+            self.define_constraint(-position[0](1.) + end[0] - self.tolerance*0.9, -inf, 0.)
+            self.define_constraint(position[1](1.) - end[1] - self.tolerance*0.9, -inf, 0.)
+            self.define_constraint(-position[1](1.) + end[1] - self.tolerance*0.9, -inf, 0.)
 
     def splines2signals(self, splines, time):
         signals = {}
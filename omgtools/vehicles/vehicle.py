@@ -162,9 +162,12 @@ class Vehicle(OptiChild, PlotLayer):
             # then decide on type of constraints to use:
             # room_limits or hyperplanes
             if self.options['room_constraints']:
-                lims = room['shape'].get_canvas_limits()
-                room_limits = []
-                room_limits += [lims[k]+room['position'][k] for k in range(self.n_dim)]
+                if 'limits' in room:  # parametric room, see Environment
+                    room_limits = room['limits']
+                else:
+                    lims = room['shape'].get_canvas_limits()
+                    room_limits = []
+                    room_limits += [lims[k]+room['position'][k] for k in range(self.n_dim)]
                 if ((isinstance(room['shape'], (Rectangle, Square)) and
                     room['shape'].orientation == 0.0) and
                     (isinstance(shape, Circle) or
@@ -176,7 +179,10 @@ class Vehicle(OptiChild, PlotLayer):
                             self.define_constraint(-(chck[k]+position[k]) + room_limits[k][0] + rad[0], -inf, 0.)
                             self.define_constraint((chck[k]+position[k]) - room_limits[k][1] + rad[0], -inf, 0.)
                 else:
-                    hyp_room = room['shape'].get_hyperplanes(position = room['position'])
+                    if 'hyperplanes' in room:
+                        hyp_room = room['hyperplanes']
+                    else:
+                        hyp_room = room['shape'].get_hyperplanes(position = room['position'])
                     for l, chck in enumerate(checkpoints):
                         for hpp in hyp_room.values():
                             con = 0
@@ -221,9 +227,12 @@ class Vehicle(OptiChild, PlotLayer):
                             sum([a[k]*(chck[k]+position[k]) for k in range(3)])-b+rad[l]+safety_distance-eps, -inf, 0)
             # room constraints
             if self.options['room_constraints']:
-                lims = room['shape'].get_canvas_limits()
-                room_limits = []
-                room_limits += [lims[k]+room['position'][k] for k in range(self.n_dim)]
+                if 'limits' in room:  # parametric room, see Environment
+                    room_limits = room['limits']
+                else:
+                    lims = room['shape'].get_canvas_limits()
+                    room_limits = []
+                    room_limits += [lims[k]+room['position'][k] for k in range(self.n_dim)]
                 for chck in checkpoints:
                     for k in range(3):
                         self.define_constraint(-
@@ -239,6 +248,38 @@ class Vehicle(OptiChild, PlotLayer):
         else:
             return [s+rp for s, rp in zip(splines, rel_pos)]
 
+    def get_max_speed(self):
+        # upper bound on the speed of the vehicle, None if it is unknown
+        if hasattr(self, 'vmax'):
+            vmax = max(abs(self.vmax), abs(getattr(self, 'vmin', 0.)))
+            if self.options.get('syslimit') == 'norm_inf':
+                # vmin and vmax bound every axis
+                vmax *= np.sqrt(self.n_dim)
+            return vmax
+        # bounds per axis
+        bounds = []
+        for ax in 'xyz'[:self.n_dim]:
+            if not (hasattr(self, 'v'+ax+'min') and hasattr(self, 'v'+ax+'max')):
+                # unbounded (on one side)
+                return None
+            bounds.append(max(abs(getattr(self, 'v'+ax+'min')),
+                              abs(getattr(self, 'v'+ax+'max'))))
+        return max(bounds)*np.sqrt(len(bounds))
+
+    def get_reach(self, horizon_time):
+        # Ball (center, radius) that contains the vehicle, starting from its
+        # predicted state, during horizon_time. None if it is unknown.
+        vmax = self.get_max_speed()
+        if vmax is None or 'state' not in self.prediction:
+            return None
+        center = np.array(self._state2pose(np.array(self.prediction['state'], dtype=float)),
+                          dtype=float).ravel()[:self.n_dim]
+        size = 0.
+        for shape in self.shapes:
+            checkpoints, rad = shape.get_checkpoints()
+            size = max([size] + [np.linalg.norm(c) + r for c, r in zip(checkpoints, rad)])
+        return center, vmax*horizon_time + size + self.options['safety_distance']
+
     def set_parameters(self, current_time):
         parameters = {self: {}}
         return parameters